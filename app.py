@@ -1,34 +1,108 @@
+import hashlib
+import io
 import os
 import logging
+import numpy as np
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
 from flask import Flask, render_template, request, jsonify, send_file
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
 from werkzeug.utils import secure_filename
 from werkzeug.middleware.proxy_fix import ProxyFix
 from src.pdf_processor import PDFProcessor
-from src.floor_plan_analyzer import FloorPlanAnalyzer
+from src.floor_plan_analyzer import get_floor_plan_analyzer
 from src.dxf_builder import DXFBuilder
 from src.advanced_wall_detector import AdvancedWallDetector
 from src.boundary_matcher import BoundaryMatcher
-import traceback
+from src.analysis_cache import AnalysisCache, hash_file, perceptual_hash
+from src.job_queue import JobQueue, QueueFull
+from src.file_utils import make_work_dir, remove_work_dir, stream_to_file
+
+# orjson is an optional speed-up and deliberately not a declared dependency:
+# when it is installed jsonify() uses ORJSONProvider, otherwise Flask's default
+# provider (extended with NumPy support by NumPyJSONProvider) returns equivalent JSON
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+class NumPyJSONProvider(DefaultJSONProvider):
+    """Flask's default JSON provider, also accepting NumPy arrays and scalars"""
+    
+    @staticmethod
+    def default(o):
+        if isinstance(o, (np.ndarray, np.generic)):
+            return o.tolist()
+        return DefaultJSONProvider.default(o)
+
+class ORJSONProvider(NumPyJSONProvider):
+    """
+    jsonify() backed by orjson; falls back to Flask's encoder hooks for unsupported types.
+    NumPy arrays and scalars (e.g. vectorized coordinates, confidences) are serialized natively.
+    """
+    
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_SERIALIZE_NUMPY
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 app = Flask(__name__)
+app.json = ORJSONProvider(app) if orjson is not None else NumPyJSONProvider(app)
+logger.info("JSON responses use %s", type(app.json).__name__)
 app.secret_key = os.environ.get("SESSION_SECRET")
 app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['OUTPUT_FOLDER'] = 'outputs'
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max
+# File parts spool to a temp file past 500 KB; the form has no other fields worth buffering
+app.config['MAX_FORM_MEMORY_SIZE'] = 64 * 1024
+app.config['MAX_FORM_PARTS'] = 16
+
+# Behind nginx, set X_ACCEL_REDIRECT to an `internal` location aliased to the outputs
+# folder (e.g. /protected/outputs/) so nginx streams downloads instead of a worker
+app.config['X_ACCEL_REDIRECT'] = os.environ.get('X_ACCEL_REDIRECT')
 
 # Ensure directories exist
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['OUTPUT_FOLDER'], exist_ok=True)
 
-ALLOWED_EXTENSIONS = {'pdf'}
+# On-disk cache of AI / wall detection results keyed by PDF content hash
+analysis_cache = AnalysisCache(os.path.join(app.config['OUTPUT_FOLDER'], '.ai_cache'))
+
+# Stateless, so one detector serves every request in the process
+wall_detector = AdvancedWallDetector()
+
+# Pipelines run in background worker processes; /process returns a job id to poll.
+# Uploads beyond MAX_PENDING_JOBS in flight are turned away rather than queued on disk.
+# Job state lives in this process's memory, so the app must be deployed as one
+# always-on instance (.replit deploymentTarget = "vm") with a single gunicorn worker.
+job_queue = JobQueue(max_pending=int(os.environ.get('MAX_PENDING_JOBS', 16)))
+
+ALLOWED_EXTENSIONS = ('.pdf',)
+
+# Long edge (px) of the page render sent to the vision model. The model downsamples
+# larger inputs anyway, and its bounding boxes are rescaled by BoundaryMatcher,
+# so rendering at 300 DPI only costs rasterization time and memory.
+AI_TARGET_LONG_EDGE_PX = 2048
+AI_MAX_DPI = 300
+
+_BANNER = "=" * 60
+
+# Boundary kinds drawn into the DXF, in layer order (interior walls are left out: main wall only)
+BOUNDARY_KINDS = ('exterior_outer', 'exterior_inner')
 
 def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    return filename.lower().endswith(ALLOWED_EXTENSIONS)
 
 @app.route('/')
 def index():
@@ -50,64 +124,177 @@ def process_file():
         if not allowed_file(file.filename):
             return jsonify({'success': False, 'error': 'Invalid file type. Please upload PDF files only.'})
         
-        # Save uploaded file
+        # ?page=N (1-based) selects the page to trace; only that page is rendered
+        page_num = request.args.get('page', 1, type=int) - 1
+        if page_num < 0:
+            return jsonify({'success': False, 'error': 'Invalid page number'})
+        
         filename = secure_filename(file.filename or 'uploaded.pdf')
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        logger.info("Processing uploaded file: %s", filename)
+        
+        # ?use_cache=0 forces fresh analysis (results are re-cached)
+        use_cache = request.args.get('use_cache', '1').lower() not in ('0', 'false', 'no')
         
-        logger.info(f"Processing uploaded file: {filename}")
+        # ?download=1 processes synchronously and streams the DXF straight back.
+        # The PDF is opened from memory (bounded by MAX_CONTENT_LENGTH) and nothing
+        # is written to the uploads or outputs folders
+        if request.args.get('download', '0').lower() in ('1', 'true', 'yes'):
+            pdf_data = file.stream.read()
+            buf = io.BytesIO()
+            result = process_pdf_drawing(filename, page_num=page_num, use_cache=use_cache,
+                                         output_stream=buf, pdf_data=pdf_data)
+            if not result['success']:
+                return jsonify(result)
+            buf.seek(0)
+            return send_file(buf, mimetype='application/dxf', as_attachment=True,
+                             download_name=result['filename'])
         
-        # Process the PDF
-        result = process_pdf_drawing(filepath)
+        # Save uploaded file into its own work dir (removed with everything in it when done)
+        workdir = make_work_dir(app.config['UPLOAD_FOLDER'])
+        filepath = os.path.join(workdir, filename)
+        try:
+            file_hash = stream_to_file(file.stream, filepath)
+        except Exception:
+            remove_work_dir(workdir)
+            raise
         
-        return jsonify(result)
+        # Process the PDF in the background
+        try:
+            job_id = job_queue.submit(process_upload, filepath, workdir, page_num=page_num,
+                                      use_cache=use_cache, file_hash=file_hash)
+        except QueueFull:
+            remove_work_dir(workdir)
+            return jsonify({'success': False, 'error': 'Server busy, please retry shortly'}), 503
+        
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'status_url': f'/status/{job_id}',
+            'result_url': f'/result/{job_id}'
+        }), 202
         
     except Exception as e:
-        logger.error(f"Error processing file: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Error processing file: %s", e)
         return jsonify({'success': False, 'error': f'Processing error: {str(e)}'})
 
-def process_pdf_drawing(filepath: str) -> dict:
+def process_upload(filepath: str, workdir: str, **kwargs) -> dict:
+    """Run the pipeline on an uploaded PDF, then delete its work dir whatever the outcome"""
+    try:
+        return process_pdf_drawing(filepath, **kwargs)
+    finally:
+        remove_work_dir(workdir)
+
+def _cached_result(key: str, output_path: str):
+    """
+    Return the stored result for key if the DXF it points at is still the one
+    that was written (same size and mtime), else None.
+    """
+    entry = analysis_cache.get(key)
+    if entry is None:
+        return None
+    try:
+        stat = os.stat(output_path)
+    except OSError:
+        return None
+    if (stat.st_size, stat.st_mtime_ns) != (entry.get('size'), entry.get('mtime_ns')):
+        # Deleted and regenerated, or overwritten by a different upload with the same name
+        return None
+    return entry.get('result')
+
+def _store_result(key: str, output_path: str, result: dict):
+    """Remember result together with the identity of the DXF file it describes"""
+    try:
+        stat = os.stat(output_path)
+    except OSError:
+        return
+    analysis_cache.set(key, {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'result': result})
+
+def process_pdf_drawing(filepath: str, page_num: int = 0, use_cache: bool = True,
+                        file_hash: str = None, output_stream=None, pdf_data: bytes = None) -> dict:
     """
     Main processing pipeline for PDF architectural drawings.
     Combines vector extraction + AI analysis + DXF generation.
+    Only page_num (0-indexed) is extracted and rendered.
+    Wall detection and AI results are cached by PDF content hash unless use_cache is False,
+    as is the whole result of a saved DXF while that file is unchanged;
+    pass file_hash when it is already known (e.g. computed while saving the upload).
+    When output_stream is given the DXF is written to it instead of the outputs folder,
+    and the result has no download_url.
+    When pdf_data is given the PDF is read from those bytes and filepath only names the output.
     """
     try:
-        logger.info("="*60)
+        if file_hash is None:
+            file_hash = hashlib.sha256(pdf_data).hexdigest() if pdf_data is not None else hash_file(filepath)
+        
+        # Create output filename
+        base_name = os.path.splitext(os.path.basename(filepath))[0]
+        page_suffix = f"_page{page_num + 1}" if page_num else ""
+        output_filename = f"processed_{base_name}{page_suffix}.dxf"
+        output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
+        
+        # Re-uploads of the same PDF reuse the DXF already in the outputs folder
+        result_key = AnalysisCache.make_key(file_hash, page_num, 'result', output_filename)
+        if use_cache and output_stream is None:
+            cached = _cached_result(result_key, output_path)
+            if cached is not None:
+                logger.info("Reusing %s for identical upload", output_filename)
+                return cached
+        
+        logger.info(_BANNER)
         logger.info("STAGE 1: FLOOR PLAN BOUNDARY TRACING")
-        logger.info("="*60)
+        logger.info(_BANNER)
         
         # Step 1: Extract PDF data and convert to image
         logger.info("Step 1: Processing PDF...")
-        with PDFProcessor(filepath) as processor:
-            # Get page info
-            page_info = processor.get_page_info(0)
-            logger.info(f"  PDF: {page_info['width_pt']:.0f}x{page_info['height_pt']:.0f} pt, "
-                       f"{page_info['num_vector_paths']} vector paths")
+        with PDFProcessor(pdf_data if pdf_data is not None else filepath) as processor:
+            # Extract vector paths for original drawing (once; page info reuses them)
+            vector_paths = processor.extract_vector_paths(page_num)
             
-            # Extract vector paths for original drawing
-            vector_paths = processor.extract_vector_paths(0)
-            logger.info(f"  Extracted {len(vector_paths)} vector paths")
+            # Get page info
+            page_info = processor.get_page_info(page_num)
+            page_w_pt = float(page_info['width_pt'])
+            page_h_pt = float(page_info['height_pt'])
+            logger.info("  PDF: %.0fx%.0f pt, %d vector paths",
+                        page_w_pt, page_h_pt, page_info['num_vector_paths'])
             
             # Convert to image for AI analysis
-            image, metadata = processor.convert_to_image(0, dpi=300)
-            logger.info(f"  Converted to {metadata['width_px']}x{metadata['height_px']} image")
+            ai_dpi = min(AI_MAX_DPI, int(72 * AI_TARGET_LONG_EDGE_PX / max(page_w_pt, page_h_pt)))
+            image, metadata = processor.convert_to_image(page_num, dpi=ai_dpi)
+            logger.info("  Converted to %dx%d image", metadata['width_px'], metadata['height_px'])
         
-        # Step 2A: High-fidelity wall detection - extract ALL boundary candidates (no classification)
-        logger.info("Step 2A: Detecting wall boundaries (high-fidelity mode)...")
-        wall_detector = AdvancedWallDetector()
-        all_boundary_candidates = wall_detector.detect_all_boundaries(vector_paths)
-        logger.info(f"  Detected {len(all_boundary_candidates)} boundary candidates total")
+        # Steps 2A and 2B are independent: the AI request (network-bound) runs in a
+        # helper thread while wall detection (CPU-bound) runs here
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            # Step 2B: AI Analysis - detect metadata + main wall locations
+            logger.info("Step 2B: AI analyzing floor plan (metadata + wall locations)...")
+            # Near-duplicate renders (re-scans, small edits) of the same size reuse the AI result
+            ai_future = pool.submit(
+                analysis_cache.get_or_compute,
+                AnalysisCache.make_key(file_hash, page_num, 'floor', f"{image.width}x{image.height}"),
+                lambda: get_floor_plan_analyzer().analyze_floor_plan(image),
+                use_cache=use_cache,
+                phash=lambda: perceptual_hash(image),
+                namespace=AnalysisCache.make_key('floor', f"{image.width}x{image.height}")
+            )
+            
+            # Step 2A: High-fidelity wall detection - extract ALL boundary candidates (no classification)
+            logger.info("Step 2A: Detecting wall boundaries (high-fidelity mode)...")
+            all_boundary_candidates = analysis_cache.get_or_compute(
+                AnalysisCache.make_key(file_hash, page_num, 'vector'),
+                lambda: wall_detector.detect_all_boundaries(vector_paths),
+                use_cache=use_cache
+            )
+            logger.info("  Detected %d boundary candidates total", len(all_boundary_candidates))
+            
+            ai_result = ai_future.result()
         
-        # Step 2B: AI Analysis - detect metadata + main wall locations
-        logger.info("Step 2B: AI analyzing floor plan (metadata + wall locations)...")
-        analyzer = FloorPlanAnalyzer()
-        ai_result = analyzer.analyze_floor_plan(image)
+        # The page render is only needed by the AI step; free it before building the DXF
+        del image
         
         floor_type = ai_result['floor_type']
         confidence = ai_result['confidence']
-        logger.info(f"  Floor type: {floor_type} (confidence: {confidence:.0%})")
-        logger.info(f"  Has garage: {ai_result['has_garage']}")
+        logger.info("  Floor type: %s (confidence: %.0f%%)", floor_type, confidence * 100)
+        logger.info("  Has garage: %s", ai_result['has_garage'])
         
         # Step 2C: Hybrid Matching - use AI guidance to select correct boundaries
         logger.info("Step 2C: Matching AI regions with vector boundaries...")
@@ -116,8 +303,8 @@ def process_pdf_drawing(filepath: str) -> dict:
             ai_outer_bbox=ai_result.get('exterior_outer_bbox'),
             ai_inner_bbox=ai_result.get('exterior_inner_bbox'),
             all_boundaries=all_boundary_candidates,
-            page_width=page_info['width_pt'],
-            page_height=page_info['height_pt'],
+            page_width=page_w_pt,
+            page_height=page_h_pt,
             image_width=metadata['width_px'],
             image_height=metadata['height_px']
         )
@@ -125,104 +312,122 @@ def process_pdf_drawing(filepath: str) -> dict:
         # Step 3: Build DXF with original drawing + traced boundaries
         logger.info("Step 3: Building DXF output...")
         
-        # Create output filename
-        base_name = os.path.splitext(os.path.basename(filepath))[0]
-        output_filename = f"processed_{base_name}.dxf"
-        output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
-        
         # Initialize DXF builder
         dxf_builder = DXFBuilder(output_path)
         
         # Add original PDF vectors
-        dxf_builder.add_pdf_vectors(
-            vector_paths,
-            page_info['width_pt'],
-            page_info['height_pt']
-        )
+        dxf_builder.add_pdf_vectors(vector_paths, page_w_pt, page_h_pt)
         
         # Transform PDF coordinates to DXF coordinates
-        page_height_pt = page_info['height_pt']
-        scale = 1000.0 / max(page_info['width_pt'], page_info['height_pt'])
+        scale = 1000.0 / max(page_w_pt, page_h_pt)
         
         # Convert PDF point coordinates to DXF coordinates
         def pdf_to_dxf(coords):
-            """Convert PDF point coordinates to DXF coordinates"""
-            dxf_coords = []
-            for x_pt, y_pt in coords:
-                # Transform to DXF coordinates (flip Y, scale)
-                dxf_x = x_pt * scale
-                dxf_y = (page_height_pt - y_pt) * scale
-                dxf_coords.append((dxf_x, dxf_y))
-            return dxf_coords
+            """Convert PDF point coordinates to an (N, 2) array of DXF coordinates (flip Y, scale)"""
+            return DXFBuilder.transform_points(coords, page_h_pt, scale)
         
         # Add ONLY exterior walls - outer and inner boundaries (main wall only)
-        if wall_boundaries['exterior_outer']:
-            outer_coords = pdf_to_dxf(wall_boundaries['exterior_outer'])
-            dxf_builder.add_boundary(outer_coords, floor_type, 'exterior_outer')
-            logger.info(f"  Added exterior OUTER boundary ({len(outer_coords)} points)")
-        
-        # Add exterior walls - inner boundary
-        if wall_boundaries['exterior_inner']:
-            inner_coords = pdf_to_dxf(wall_boundaries['exterior_inner'])
-            dxf_builder.add_boundary(inner_coords, floor_type, 'exterior_inner')
-            logger.info(f"  Added exterior INNER boundary ({len(inner_coords)} points)")
+        added_kinds = []
+        for kind in BOUNDARY_KINDS:
+            points = wall_boundaries.get(kind)
+            if not points:
+                continue
+            coords = pdf_to_dxf(points)
+            dxf_builder.add_boundary(coords, floor_type, kind)
+            added_kinds.append(kind)
+            logger.info("  Added %s boundary (%d points)", kind, len(coords))
         
         # Interior walls are NOT highlighted - only showing outer main wall boundaries
-        logger.info(f"  Skipping {len(wall_boundaries['interior_walls'])} interior walls (main wall only mode)")
+        logger.info("  Skipping %d interior walls (main wall only mode)",
+                    len(wall_boundaries.get('interior_walls', ())))
         
-        # Save DXF file
-        dxf_builder.save()
-        logger.info(f"  DXF saved: {output_filename}")
+        # Save DXF file (or hand it straight to the caller)
+        if output_stream is not None:
+            dxf_builder.write(output_stream)
+            logger.info("  DXF written in memory: %s", output_filename)
+        else:
+            dxf_builder.save()
+            logger.info("  DXF saved: %s", output_filename)
         
-        logger.info("="*60)
+        logger.info(_BANNER)
         logger.info("PROCESSING COMPLETE!")
-        logger.info("="*60)
+        logger.info(_BANNER)
         
         # Prepare response
-        layers_created = ['ORIGINAL_DRAWING']
-        
-        if wall_boundaries['exterior_outer']:
-            layers_created.append(f'{floor_type}_exterior_outer')
-        
-        if wall_boundaries['exterior_inner']:
-            layers_created.append(f'{floor_type}_exterior_inner')
-        
-        # Count boundaries (only exterior walls - main wall only)
-        num_exterior_outer = 1 if wall_boundaries['exterior_outer'] else 0
-        num_exterior_inner = 1 if wall_boundaries['exterior_inner'] else 0
+        layers_created = ['ORIGINAL_DRAWING'] + [f'{floor_type}_{kind}' for kind in added_kinds]
         
-        return {
+        result = {
             'success': True,
+            'filename': output_filename,
             'analysis': {
                 'floor_type': floor_type,
                 'confidence': confidence,
                 'has_garage': ai_result['has_garage'],
                 'layers_created': layers_created,
-                'boundaries_detected': {
-                    'exterior_outer': num_exterior_outer,
-                    'exterior_inner': num_exterior_inner
-                }
-            },
-            'download_url': f'/download/{output_filename}'
+                # Count boundaries (only exterior walls - main wall only)
+                'boundaries_detected': {kind: int(kind in added_kinds) for kind in BOUNDARY_KINDS}
+            }
         }
+        if output_stream is None:
+            result['download_url'] = f'/download/{output_filename}'
+            _store_result(result_key, output_path, result)
+        return result
         
     except Exception as e:
-        logger.error(f"Processing failed: {str(e)}")
-        traceback.print_exc()
+        logger.exception("Processing failed: %s", e)
         return {'success': False, 'error': str(e)}
 
+@app.route('/status/<job_id>')
+def job_status(job_id):
+    """Report whether a processing job is queued, running, finished or failed"""
+    status = job_queue.status(job_id)
+    if status is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({'job_id': job_id, 'status': status})
+
+@app.route('/result/<job_id>')
+def job_result(job_id):
+    """Return the processing result of a finished job"""
+    status = job_queue.status(job_id)
+    if status is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    if status in ('queued', 'running'):
+        return jsonify({'success': False, 'status': status}), 202
+    try:
+        return jsonify(job_queue.result(job_id))
+    except Exception as e:
+        logger.exception("Job %s failed: %s", job_id, e)
+        return jsonify({'success': False, 'error': f'Processing error: {str(e)}'})
+
 @app.route('/download/<filename>')
 def download_file(filename):
     """Download processed DXF file"""
     try:
-        file_path = os.path.join(app.config['OUTPUT_FOLDER'], filename)
-        if os.path.exists(file_path):
-            return send_file(file_path, as_attachment=True)
-        else:
-            return jsonify({'error': 'File not found'}), 404
+        # safe_join rejects "../" and absolute names; realpath catches a
+        # symlink inside outputs/ that points somewhere else
+        output_dir = os.path.realpath(app.config['OUTPUT_FOLDER'])
+        file_path = safe_join(output_dir, filename)
+        if file_path is None or not os.path.realpath(file_path).startswith(output_dir + os.sep):
+            raise NotFound()
+        
+        accel_prefix = app.config['X_ACCEL_REDIRECT']
+        if accel_prefix:
+            # Let nginx send the bytes (it handles ranges/conditionals and missing files)
+            response = app.response_class(mimetype='application/dxf')
+            response.headers['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + quote(filename)
+            response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+            return response
+        
+        # Answers If-None-Match / If-Modified-Since / Range requests (304 / 206).
+        # No exists() check first: send_file's own stat reports a missing file
+        return send_file(
+            file_path, as_attachment=True, conditional=True, etag=True, max_age=0
+        )
+    except (NotFound, FileNotFoundError, IsADirectoryError):
+        return jsonify({'error': 'File not found'}), 404
     except Exception as e:
-        logger.error(f"Download error: {str(e)}")
+        logger.exception("Download error: %s", e)
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 5000)), debug=os.environ.get('FLASK_DEBUG', '').lower() in ('1', 'true'))
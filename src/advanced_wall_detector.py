@@ -2,17 +2,31 @@
 AdvancedWallDetector - High-fidelity wall boundary detection preserving all geometry
 Retains all path vertices including curves and properly identifies parallel wall pairs
 """
+import hashlib
+import itertools
 import logging
+import threading
 import numpy as np
 from scipy.spatial import KDTree
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
 
 logger = logging.getLogger(__name__)
 
+# Stroke colors of wall paths, as PyMuPDF reports them
+_BLACK = (0.0, 0.0, 0.0)
+_BLACK_LIST = [0.0, 0.0, 0.0]
+
 
 class AdvancedWallDetector:
     """High-fidelity wall detection preserving all vector geometry"""
     
+    # _snap_vertices results shared by all instances, keyed by (vertex array digest,
+    # snap tolerance), so repeated page geometry is not re-snapped; least recently
+    # used entries are evicted first
+    SNAP_CACHE_SIZE = 8
+    _snap_cache: 'OrderedDict[tuple, list]' = OrderedDict()
+    _snap_cache_lock = threading.Lock()
+    
     def __init__(self):
         self.wall_threshold_width = 0.2
         self.snap_tolerance = 0.5  # Very tight snapping for vertex precision
@@ -63,18 +77,21 @@ class AdvancedWallDetector:
     
     def _extract_all_wall_geometry(self, vector_paths: list) -> tuple:
         """Extract ALL vertices from wall paths, preserving curves and polylines"""
-        all_vertices = []
         wall_paths_data = []
+        num_vertices = 0
+        extract_point = self._extract_point
+        
+        wall_threshold_width = self.wall_threshold_width
         
         for path in vector_paths:
-            stroke_color = path.get('color')
+            # Filter for wall paths (black strokes with width). Width goes first: it is
+            # a single comparison and rejects the many thin construction/annotation lines
             width = path.get('width', 0)
+            if width is None or not width >= wall_threshold_width:
+                continue
             
-            # Filter for wall paths (black strokes with width)
-            is_black = (stroke_color == (0.0, 0.0, 0.0) or stroke_color == [0.0, 0.0, 0.0])
-            has_width = width is not None and width >= self.wall_threshold_width
-            
-            if not (is_black and has_width):
+            stroke_color = path.get('color')
+            if stroke_color != _BLACK and stroke_color != _BLACK_LIST:
                 continue
             
             # Extract ALL vertices from this path
@@ -90,15 +107,15 @@ class AdvancedWallDetector:
                 
                 # Move command - update position
                 if item_type == 'm' and len(item) > 1:
-                    point = self._extract_point(item[1])
+                    point = extract_point(item[1])
                     if point:
                         current_pos = point
                         path_vertices.append(point)
                 
                 # Line command - add both endpoints
                 elif item_type == 'l' and len(item) >= 3:
-                    p1 = self._extract_point(item[1])
-                    p2 = self._extract_point(item[2])
+                    p1 = extract_point(item[1])
+                    p2 = extract_point(item[2])
                     if p1 and p2:
                         path_vertices.extend([p1, p2])
                         current_pos = p2
@@ -106,7 +123,7 @@ class AdvancedWallDetector:
                 # Curve command - add ALL control points
                 elif item_type == 'c' and len(item) > 1:
                     for i in range(1, len(item)):
-                        point = self._extract_point(item[i])
+                        point = extract_point(item[i])
                         if point:
                             path_vertices.append(point)
                             current_pos = point
@@ -114,7 +131,7 @@ class AdvancedWallDetector:
                 # Quadratic bezier - add control points
                 elif item_type == 'qu' and len(item) > 1:
                     for i in range(1, len(item)):
-                        point = self._extract_point(item[i])
+                        point = extract_point(item[i])
                         if point:
                             path_vertices.append(point)
                             current_pos = point
@@ -129,11 +146,9 @@ class AdvancedWallDetector:
                     else:
                         continue
                     
-                    corners = [
-                        (x, y), (x + w, y),
-                        (x + w, y + h), (x, y + h)
-                    ]
-                    path_vertices.extend(corners)
+                    x2 = x + w
+                    y2 = y + h
+                    path_vertices += ((x, y), (x2, y), (x2, y2), (x, y2))
                 
                 # Close path - connect back to start
                 elif item_type == 'h':
@@ -141,12 +156,22 @@ class AdvancedWallDetector:
                         path_vertices.append(path_vertices[0])
             
             if path_vertices:
-                all_vertices.extend(path_vertices)
+                num_vertices += len(path_vertices)
                 wall_paths_data.append({
                     'vertices': path_vertices,
                     'width': width
                 })
         
+        # Paths keep their vertices as lists of tuples (boundaries are cached as JSON);
+        # the snap step gets every vertex as one contiguous (N, 2) array, filled in a
+        # single pass without an intermediate list of all vertices
+        all_vertices = np.fromiter(
+            itertools.chain.from_iterable(
+                itertools.chain.from_iterable(p['vertices'] for p in wall_paths_data)
+            ),
+            dtype=np.float64, count=2 * num_vertices
+        ).reshape(-1, 2)
+        
         # Remove duplicate vertices (snap nearby points)
         unique_vertices = self._snap_vertices(all_vertices)
         return unique_vertices, wall_paths_data
@@ -159,62 +184,96 @@ class AdvancedWallDetector:
             return (point_data[0], point_data[1])
         return None
     
-    def _snap_vertices(self, vertices: list) -> list:
-        """Snap nearby vertices together to remove duplicates"""
-        if not vertices:
+    def _snap_vertices(self, vertices) -> list:
+        """Snap nearby vertices (a list of (x, y) or an (N, 2) array) together to remove duplicates"""
+        if len(vertices) == 0:
             return []
         
-        # Build KD-tree for fast nearest neighbor search
-        vertices_array = np.array(vertices)
-        tree = KDTree(vertices_array)
+        vertices_array = np.ascontiguousarray(vertices, dtype=np.float64)
+        
+        key = (hashlib.blake2b(vertices_array.tobytes(), digest_size=16).digest(), self.snap_tolerance)
+        with self._snap_cache_lock:
+            cached = self._snap_cache.get(key)
+            if cached is not None:
+                self._snap_cache.move_to_end(key)
+        if cached is not None:
+            return list(cached)
+        
+        unique_vertices = self._snap_vertex_array(vertices_array)
         
-        # Find clusters of nearby vertices
-        visited = set()
-        unique_vertices = []
+        with self._snap_cache_lock:
+            self._snap_cache[key] = unique_vertices
+            self._snap_cache.move_to_end(key)
+            while len(self._snap_cache) > self.SNAP_CACHE_SIZE:
+                self._snap_cache.popitem(last=False)
+        return list(unique_vertices)
+    
+    def _snap_vertex_array(self, vertices_array: np.ndarray) -> list:
+        """Uncached _snap_vertices on an (N, 2) float64 array"""
+        # Paths share endpoints, so many vertices are exact duplicates. Collapse them first
+        # (keeping a multiplicity per point) and visit points in order of first appearance,
+        # which gives the same clusters and means as snapping every copy
+        points, first_index, counts = np.unique(
+            vertices_array, axis=0, return_index=True, return_counts=True
+        )
+        order = np.argsort(first_index, kind='stable')
+        points, counts = points[order], counts[order]
+        weighted = points * counts[:, None]
+        
+        # Build KD-tree for fast nearest neighbor search. Each point is queried once,
+        # so a cheaper unbalanced build beats a slightly faster query; larger leaves
+        # suit 2-D points with tiny query radii
+        tree = KDTree(points, leafsize=32, balanced_tree=False, compact_nodes=False)
+        
+        # Find all points within snap tolerance of each point in one batched query
+        # (runs in C across all cores instead of one Python call per vertex)
+        neighborhoods = tree.query_ball_point(points, self.snap_tolerance, workers=-1)
+        
+        # A point with nothing else within tolerance is a cluster of its own and no other
+        # neighbourhood contains it, so it keeps its position and skips the loop. That is
+        # most points on a clean drawing, and all of them on a single simple outline
+        sizes = np.fromiter(map(len, neighborhoods), dtype=np.intp, count=len(points))
+        if not (sizes > 1).any():
+            return [tuple(p) for p in points.tolist()]
+        
+        # Find clusters of nearby vertices. Each cluster is represented at the index of
+        # the point that started it, so emitting in index order keeps the visiting order
+        visited = np.zeros(len(points), dtype=bool)
+        emitted = sizes == 1
+        snapped = points.copy()
         
-        for i, vertex in enumerate(vertices):
-            if i in visited:
+        for i in np.flatnonzero(sizes > 1).tolist():
+            if visited[i]:
                 continue
+            indices = neighborhoods[i]
             
-            # Find all vertices within snap tolerance
-            indices = tree.query_ball_point(vertex, self.snap_tolerance)
-            
-            # Average their positions to get snapped vertex
-            cluster_points = vertices_array[indices]
-            snapped = tuple(cluster_points.mean(axis=0))
-            unique_vertices.append(snapped)
+            # Average their positions (each copy counted) to get snapped vertex
+            snapped[i] = weighted[indices].sum(axis=0) / counts[indices].sum()
+            emitted[i] = True
             
             # Mark all as visited
-            visited.update(indices)
+            visited[indices] = True
         
-        return unique_vertices
+        return [tuple(p) for p in snapped[emitted].tolist()]
     
     def _trace_closed_loops(self, vertices: list, wall_paths: list) -> list:
         """Trace closed boundary loops from wall path vertices"""
-        boundaries = []
-        
         # Each wall path is already a sequence of connected vertices
         # We just need to identify which ones form closed loops
-        for path_data in wall_paths:
-            path_vertices = path_data['vertices']
-            
-            if len(path_vertices) < 3:
-                continue
-            
-            # Check if path is closed (first and last points are close)
-            first = path_vertices[0]
-            last = path_vertices[-1]
-            dist = np.sqrt((first[0] - last[0])**2 + (first[1] - last[1])**2)
-            
-            if dist < self.snap_tolerance * 3:
-                # Closed loop - use all vertices
-                boundaries.append(path_vertices)
-            else:
-                # Open path - still include if it has enough vertices
-                if len(path_vertices) >= 5:
-                    boundaries.append(path_vertices)
+        if not wall_paths:
+            return []
         
-        return boundaries
+        # Endpoints and lengths of all paths as arrays, tested in one pass
+        firsts = np.array([p['vertices'][0] for p in wall_paths], dtype=np.float64)
+        lasts = np.array([p['vertices'][-1] for p in wall_paths], dtype=np.float64)
+        lengths = np.fromiter((len(p['vertices']) for p in wall_paths), dtype=np.intp, count=len(wall_paths))
+        
+        # Closed loops (first and last points are close) are used with all vertices;
+        # open paths are still included if they have enough vertices
+        closed = np.hypot(firsts[:, 0] - lasts[:, 0], firsts[:, 1] - lasts[:, 1]) < self.snap_tolerance * 3
+        keep = (lengths >= 3) & (closed | (lengths >= 5))
+        
+        return [wall_paths[i]['vertices'] for i in np.flatnonzero(keep)]
     
     def _classify_wall_boundaries(self, boundaries: list, page_width: float, page_height: float) -> dict:
         """Classify boundaries using bounding box size and proximity to page edges"""
@@ -227,18 +286,15 @@ class AdvancedWallDetector:
             if len(boundary) < 3:
                 continue
             
-            # Calculate perimeter (total path length)
-            perimeter = 0
-            for i in range(len(boundary)):
-                p1 = boundary[i]
-                p2 = boundary[(i + 1) % len(boundary)]
-                perimeter += np.sqrt((p2[0]-p1[0])**2 + (p2[1]-p1[1])**2)
+            points = np.asarray(boundary, dtype=np.float64)
+            
+            # Calculate perimeter (total path length, closing edge included)
+            edges = np.diff(points, axis=0, append=points[:1])
+            perimeter = float(np.hypot(edges[:, 0], edges[:, 1]).sum())
             
             # Calculate bounding box
-            xs = [p[0] for p in boundary]
-            ys = [p[1] for p in boundary]
-            min_x, max_x = min(xs), max(xs)
-            min_y, max_y = min(ys), max(ys)
+            min_x, min_y = points.min(axis=0).tolist()
+            max_x, max_y = points.max(axis=0).tolist()
             
             # Calculate bounding box dimensions
             bbox_width = max_x - min_x
@@ -273,7 +329,15 @@ class AdvancedWallDetector:
         
         # Sort by edge proximity FIRST (exterior walls must be near edges), then bbox size
         # Main walls should be closest to page edges AND have large bounding boxes
-        boundary_info.sort(key=lambda b: (-b['edge_distance'], b['bbox_size_ratio'], b['perimeter']), reverse=True)
+        # (one stable C-level lexsort over metric arrays; the last key is the primary one)
+        edge_distances = np.fromiter((b['edge_distance'] for b in boundary_info), dtype=np.float64, count=len(boundary_info))
+        size_ratios = np.fromiter((b['bbox_size_ratio'] for b in boundary_info), dtype=np.float64, count=len(boundary_info))
+        perimeters = np.fromiter((b['perimeter'] for b in boundary_info), dtype=np.float64, count=len(boundary_info))
+        order = np.lexsort((-perimeters, -size_ratios, edge_distances))
+        boundary_info = [boundary_info[i] for i in order]
+        perimeters = perimeters[order]
+        bboxes = np.array([(b['min_x'], b['max_x'], b['min_y'], b['max_y']) for b in boundary_info],
+                          dtype=np.float64).reshape(-1, 4)
         
         # Debug: Log top candidates
         logger.info(f"  Top boundary candidates (by edge proximity):")
@@ -292,27 +356,29 @@ class AdvancedWallDetector:
             result['exterior_outer'] = outer['points']
             logger.info(f"  Selected OUTER: bbox_ratio={outer['bbox_size_ratio']:.2%}, {len(outer['points'])} points")
             
-            # Inner = second longest boundary that's inside outer
-            for candidate in boundary_info[1:]:
-                # Check if inside outer (with tolerance)
-                is_inside = (
-                    candidate['min_x'] >= outer['min_x'] - 10 and
-                    candidate['max_x'] <= outer['max_x'] + 10 and
-                    candidate['min_y'] >= outer['min_y'] - 10 and
-                    candidate['max_y'] <= outer['max_y'] + 10
-                )
-                
-                # Must have significant perimeter (at least 40% of outer)
-                is_significant = candidate['perimeter'] > outer['perimeter'] * 0.4
-                
-                if is_inside and is_significant:
-                    result['exterior_inner'] = candidate['points']
-                    logger.info(f"  Selected INNER: bbox_ratio={candidate['bbox_size_ratio']:.2%}, {len(candidate['points'])} points")
-                    # Rest are interior
-                    for other in boundary_info[2:]:
-                        if other is not candidate:
-                            result['interior_walls'].append(other['points'])
-                    break
+            # Inner = second longest boundary that's inside outer, tested for all candidates at once
+            # Check if inside outer (with tolerance)
+            min_x, max_x, min_y, max_y = bboxes[1:].T
+            is_inside = (
+                (min_x >= outer['min_x'] - 10) &
+                (max_x <= outer['max_x'] + 10) &
+                (min_y >= outer['min_y'] - 10) &
+                (max_y <= outer['max_y'] + 10)
+            )
+            
+            # Must have significant perimeter (at least 40% of outer)
+            is_significant = perimeters[1:] > outer['perimeter'] * 0.4
+            
+            matches = np.flatnonzero(is_inside & is_significant)
+            if matches.size:
+                chosen = int(matches[0]) + 1
+                candidate = boundary_info[chosen]
+                result['exterior_inner'] = candidate['points']
+                logger.info(f"  Selected INNER: bbox_ratio={candidate['bbox_size_ratio']:.2%}, {len(candidate['points'])} points")
+                # Rest are interior
+                result['interior_walls'] = [
+                    other['points'] for i, other in enumerate(boundary_info[2:], start=2) if i != chosen
+                ]
             
             # If no suitable inner found, offset outer inward
             if not result['exterior_inner']:
@@ -330,39 +396,26 @@ class AdvancedWallDetector:
         if len(boundary) < 3:
             return []
         
-        offset_points = []
+        # Work on all vertices at once. Row i of edges is the edge into point i; rolled
+        # by one it is the edge out of point i (wrapping around the boundary)
+        points = np.asarray(boundary, dtype=np.float64)
+        edges = points - np.roll(points, 1, axis=0)
         
-        for i in range(len(boundary)):
-            # Get three consecutive points (with wrapping)
-            p_prev = boundary[(i - 1) % len(boundary)]
-            p_curr = boundary[i]
-            p_next = boundary[(i + 1) % len(boundary)]
-            
-            # Calculate inward normal at current point
-            dx1 = p_curr[0] - p_prev[0]
-            dy1 = p_curr[1] - p_prev[1]
-            len1 = np.sqrt(dx1**2 + dy1**2) or 1.0
-            
-            dx2 = p_next[0] - p_curr[0]
-            dy2 = p_next[1] - p_curr[1]
-            len2 = np.sqrt(dx2**2 + dy2**2) or 1.0
-            
-            # Perpendicular vectors (inward - rotate 90° clockwise for outer boundary)
-            norm1_x = dy1 / len1
-            norm1_y = -dx1 / len1
-            
-            norm2_x = dy2 / len2
-            norm2_y = -dx2 / len2
-            
-            # Average normal
-            avg_norm_x = (norm1_x + norm2_x) / 2
-            avg_norm_y = (norm1_y + norm2_y) / 2
-            avg_len = np.sqrt(avg_norm_x**2 + avg_norm_y**2) or 1.0
-            
-            # Offset point inward
-            offset_x = p_curr[0] + (avg_norm_x / avg_len) * offset
-            offset_y = p_curr[1] + (avg_norm_y / avg_len) * offset
-            
-            offset_points.append((offset_x, offset_y))
+        # Unit edge vectors, normalized in place (zero-length edges count as length 1)
+        lengths = np.hypot(edges[:, 0], edges[:, 1])
+        lengths[lengths == 0] = 1.0
+        edges /= lengths[:, None]
+        
+        # Perpendicular vectors (inward - rotate 90° clockwise for outer boundary), averaged:
+        # the sum of the incoming and outgoing unit edges, rotated
+        direction = edges + np.roll(edges, -1, axis=0)
+        avg_norm = np.empty_like(points)
+        avg_norm[:, 0] = direction[:, 1]
+        np.negative(direction[:, 0], out=avg_norm[:, 1])
+        avg_len = np.hypot(avg_norm[:, 0], avg_norm[:, 1])
+        avg_len[avg_len == 0] = 1.0
         
-        return offset_points
+        # Offset points inward (scaled and shifted in place)
+        avg_norm *= (offset / avg_len)[:, None]
+        offset_points = np.add(avg_norm, points, out=avg_norm)
+        return [tuple(p) for p in offset_points.tolist()]
@@ -0,0 +1,256 @@
+"""
+AnalysisCache - On-disk cache for AI analyzer results
+Results are stored as JSON files keyed by the content hash of the analyzed file,
+so re-uploading the same drawing skips the expensive vision-model round-trip.
+A perceptual-hash index additionally lets near-duplicate renders reuse a result
+"""
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from typing import Callable, Optional
+import numpy as np
+from PIL import Image
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; index writes are then only thread-safe
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join('outputs', '.ai_cache')
+PHASH_INDEX_FILE = 'phash_index.json'
+PHASH_LOCK_FILE = 'phash_index.lock'
+
+
+def hash_file(file_path: str, chunk_size: int = 1 << 20) -> str:
+    """
+    Compute the SHA-256 hex digest of a file's contents.
+
+    Args:
+        file_path: Path to the file to hash
+        chunk_size: Read size in bytes (default 1 MiB)
+
+    Returns:
+        Hex digest string
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def perceptual_hash(image: Image.Image, hash_size: int = 8) -> int:
+    """
+    Compute a 64-bit difference hash (dHash) of an image.
+
+    Visually similar images (re-scans, different DPI, small edits) produce hashes
+    with a small Hamming distance.
+
+    Args:
+        image: PIL Image
+        hash_size: Hash grid size (8 gives a 64-bit hash)
+
+    Returns:
+        Hash as an integer
+    """
+    gray = image.convert('L').resize((hash_size + 1, hash_size), Image.Resampling.BOX)
+    pixels = np.asarray(gray, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def hamming_distance(hash_a: int, hash_b: int) -> int:
+    """Number of differing bits between two perceptual hashes"""
+    return (hash_a ^ hash_b).bit_count()
+
+
+class AnalysisCache:
+    """Stores JSON-serializable analyzer output on disk, one file per key"""
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, phash_threshold: int = 5,
+                 max_phash_entries: int = 2000):
+        """
+        Args:
+            cache_dir: Directory holding the cache entries
+            phash_threshold: Max Hamming distance for a near-duplicate hit
+            max_phash_entries: Perceptual hashes kept in the index; the oldest entries
+                               of the largest namespace are dropped first
+        """
+        self.cache_dir = cache_dir
+        self.phash_threshold = phash_threshold
+        self.max_phash_entries = max_phash_entries
+        self._phash_index = None  # {namespace: {phash_hex: key}}, loaded lazily
+        self._phash_index_mtime = None
+        self._phash_lock = threading.Lock()
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        """Join key parts, e.g. make_key(file_hash, page_num, 'floor') -> '<hash>:0:floor'"""
+        return ':'.join(str(part) for part in parts)
+
+    def _entry_path(self, key: str) -> str:
+        name = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{name}.json")
+
+    def get(self, key: str):
+        """Return the cached value for key, or None on a miss"""
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable cache entry {entry_path}: {e}")
+            return None
+
+    def set(self, key: str, value) -> bool:
+        """
+        Store value under key. The entry is written to a temp file and renamed
+        into place so concurrent readers never see a partial file.
+
+        Returns:
+            True if the entry was written
+        """
+        return self._write_json(self._entry_path(key), value, key)
+
+    def _write_json(self, path: str, value, label: str) -> bool:
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(value, f)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+            return True
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"Could not write cache entry for {label}: {e}")
+            return False
+
+    def _load_phash_index(self, force: bool = False) -> dict:
+        # Caller holds _phash_lock. Reloads when another process has rewritten the index.
+        index_path = os.path.join(self.cache_dir, PHASH_INDEX_FILE)
+        try:
+            mtime = os.stat(index_path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if force or self._phash_index is None or mtime != self._phash_index_mtime:
+            self._phash_index_mtime = mtime
+            try:
+                with open(index_path, 'r', encoding='utf-8') as f:
+                    self._phash_index = json.load(f)
+            except FileNotFoundError:
+                self._phash_index = {}
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable perceptual hash index {index_path}: {e}")
+                self._phash_index = {}
+        return self._phash_index
+
+    def find_similar(self, phash: int, namespace: str = '') -> Optional[str]:
+        """
+        Return the key of the closest stored entry within phash_threshold, or None.
+
+        Args:
+            phash: Perceptual hash of the image being looked up
+            namespace: Only entries stored under the same namespace are considered
+        """
+        with self._phash_lock:
+            entries = self._load_phash_index().get(namespace, {})
+            best_key, best_distance = None, self.phash_threshold + 1
+            for phash_hex, key in entries.items():
+                distance = hamming_distance(phash, int(phash_hex, 16))
+                if distance < best_distance:
+                    best_key, best_distance = key, distance
+        if best_key is not None:
+            logger.info(f"Near-duplicate drawing found (distance {best_distance}): {best_key}")
+        return best_key
+
+    def remember_phash(self, phash: int, key: str, namespace: str = '') -> None:
+        """
+        Record that the image with this perceptual hash is cached under key.
+        The index is re-read from disk under a file lock before it is rewritten,
+        so entries added by other worker processes are merged, not overwritten.
+        """
+        with self._phash_lock, self._phash_file_lock():
+            index = self._load_phash_index(force=True)
+            entries = index.setdefault(namespace, {})
+            phash_hex = f"{phash:016x}"
+            entries.pop(phash_hex, None)  # re-insert as the newest entry
+            entries[phash_hex] = key
+            self._trim_phash_index(index)
+            self.set_file(PHASH_INDEX_FILE, index)
+
+    def _trim_phash_index(self, index: dict) -> None:
+        # Drop the oldest entries of the largest namespace until the index fits
+        excess = sum(len(entries) for entries in index.values()) - self.max_phash_entries
+        for _ in range(max(0, excess)):
+            namespace = max(index, key=lambda ns: len(index[ns]))
+            entries = index[namespace]
+            del entries[next(iter(entries))]
+            if not entries:
+                del index[namespace]
+
+    @contextlib.contextmanager
+    def _phash_file_lock(self):
+        """Hold an exclusive lock on the index across processes (no-op without fcntl)"""
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(os.path.join(self.cache_dir, PHASH_LOCK_FILE), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def set_file(self, name: str, value) -> bool:
+        """Atomically write value as JSON to a named file in the cache directory"""
+        return self._write_json(os.path.join(self.cache_dir, name), value, name)
+
+    def get_or_compute(self, key: str, compute, use_cache: bool = True,
+                       phash: Optional[Callable[[], int]] = None, namespace: str = ''):
+        """
+        Return the cached value for key, calling compute() and storing its
+        result on a miss.
+
+        Args:
+            key: Cache key (see make_key)
+            compute: Zero-argument callable producing the value
+            use_cache: If False, skip the lookup and refresh the stored entry
+            phash: Optional zero-argument callable returning the image's perceptual
+                hash; only evaluated on an exact-key miss to look for near-duplicates.
+                A near-duplicate's result is returned but not stored under key, so a
+                false match is never pinned to this file's content hash
+            namespace: Perceptual hash namespace - results are only shared between
+                images analyzed with the same kind/options
+        """
+        phash_value = None
+        if use_cache:
+            cached = self.get(key)
+            if cached is not None:
+                logger.info(f"Analysis cache hit: {key}")
+                return cached
+
+            if phash is not None:
+                phash_value = phash()
+                similar_key = self.find_similar(phash_value, namespace)
+                cached = self.get(similar_key) if similar_key is not None else None
+                if cached is not None:
+                    return cached
+
+        value = compute()
+        if self.set(key, value) and phash is not None:
+            if phash_value is None:
+                phash_value = phash()
+            self.remember_phash(phash_value, key, namespace)
+        return value
@@ -1,12 +1,20 @@
 import os
 import json
 import base64
+import hashlib
+import io
+import threading
+from collections import OrderedDict
 import cv2
 import numpy as np
 from PIL import Image
 from openai import OpenAI
 import ezdxf
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional, Union
+from .analysis_cache import AnalysisCache, hash_file, perceptual_hash
+
+# Image file path or in-memory PIL image
+ImageSource = Union[str, Image.Image]
 
 # the newest OpenAI model is "gpt-4o" which was released August 7, 2025.
 # do not change this unless explicitly requested by the user
@@ -19,102 +27,10 @@ else:
     print("Warning: OPENAI_API_KEY not found. AI analysis will be disabled.")
     print("Please set your OpenAI API key in the Secrets tool.")
 
-class ArchitecturalAnalyzer:
-    """
-    AI-powered architectural drawing analyzer that can:
-    1. Detect floor plans vs elevations
-    2. Identify interior/exterior walls, garage spaces, doors, windows
-    3. Generate proper layer names for AutoCAD
-    4. Trace walls and create AutoCAD-compatible output
-    """
-
-    def __init__(self):
-        self.layer_names = {
-            'basement': {
-                'interior': 'basement_interior_wall',
-                'exterior': 'basement_exterior_wall'
-            },
-            'main_floor': {
-                'interior': 'main_floor_interior_wall',
-                'exterior': 'main_floor_exterior_wall',
-                'garage': 'main_floor_garage_wall'
-            },
-            'second_floor': {
-                'interior': 'second_floor_interior_wall',
-                'exterior': 'second_floor_exterior_wall'
-            },
-            'doors': {
-                'front': 'front_door_main',
-                'back': 'back_door_main',
-                'patio': 'patio_door_main',
-                'garage': 'garage_door_main'
-            },
-            'windows': {
-                'front': 'front_window_main',
-                'back': 'back_window_main',
-                'side': 'side_window_main',
-                'door': 'door_window_main'
-            }
-        }
-
-    def encode_image_to_base64(self, image_path: str) -> str:
-        """Convert image file to base64 string for OpenAI API"""
-        with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode('utf-8')
+# System prompts for the vision calls
+DRAWING_TYPE_PROMPT = "You are an expert in architectural drawings. Analyze the image and determine if it's a floor plan (top-down view showing room layouts) or an elevation (side view showing the exterior facade of a building). Respond with JSON format: {'type': 'floor_plan' or 'elevation', 'confidence': 0.0-1.0, 'reasoning': 'explanation'}"
 
-    def analyze_drawing_type(self, image_path: str) -> Dict:
-        """
-        Determine if the drawing is a floor plan or elevation using AI
-        """
-        if not openai:
-            raise Exception("OpenAI API key not configured. Please set up your OpenAI API key to use AI analysis features.")
-
-        base64_image = self.encode_image_to_base64(image_path)
-
-        response = openai.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an expert in architectural drawings. Analyze the image and determine if it's a floor plan (top-down view showing room layouts) or an elevation (side view showing the exterior facade of a building). Respond with JSON format: {'type': 'floor_plan' or 'elevation', 'confidence': 0.0-1.0, 'reasoning': 'explanation'}"
-                },
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": "Analyze this architectural drawing and determine if it's a floor plan or elevation view."
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}
-                        }
-                    ]
-                }
-            ],
-            response_format={"type": "json_object"},
-            timeout=60.0
-        )
-
-        content = response.choices[0].message.content
-        if content is None:
-            raise ValueError("Empty response content from OpenAI API for drawing type analysis")
-        try:
-            result = json.loads(content)
-        except json.JSONDecodeError as e:
-            raise ValueError(f"Failed to decode JSON response from OpenAI API: {e}. Response content: {content}")
-        return result
-
-    def analyze_floor_plan(self, image_path: str) -> Dict:
-        """
-        Analyze floor plan to detect walls, rooms, and spaces with improved accuracy
-        """
-        if not openai:
-            raise Exception("OpenAI API key not configured. Please set up your OpenAI API key to use AI analysis features.")
-
-        base64_image = self.encode_image_to_base64(image_path)
-
-        prompt = """
+FLOOR_PLAN_PROMPT = """
         You are an expert architectural analyst. Analyze this floor plan and trace wall boundaries with MAXIMUM DETAIL AND PRECISION.
 
         CRITICAL REQUIREMENTS:
@@ -202,12 +118,330 @@ class ArchitecturalAnalyzer:
         REMEMBER: Use MANY coordinate points to accurately trace every wall segment and corner!
         """
 
+ELEVATION_PROMPT = """
+        You are an expert architectural analyst. Analyze this elevation drawing and identify:
+
+        1. Elevation direction (front, back, left, right)
+        2. Doors (front door, patio door, etc.) with dimensions if visible
+        3. Windows with their locations and sizes
+        4. Door windows (windows within doors)
+
+        For each element, provide:
+        - Type (door/window)
+        - Subtype (front_door, patio_door, regular_window, door_window)
+        - Coordinates for drawing the element outline
+        - Dimensions if visible (e.g., "36x80" for doors)
+        - Floor level (main, basement, second, etc.)
+
+        Respond in JSON format with:
+        {
+            "elevation_direction": "front/back/left/right",
+            "elements": [
+                {
+                    "type": "door/window",
+                    "subtype": "front_door/patio_door/window/door_window",
+                    "coordinates": [[x1,y1], [x2,y2], [x3,y3], [x4,y4]],
+                    "dimensions": "36x80" or null,
+                    "floor_level": "main/basement/second",
+                    "layer_name": "suggested_layer_name"
+                }
+            ]
+        }
+        """
+
+# Single-call classification + analysis (see ArchitecturalAnalyzer.process_drawing)
+COMBINED_PROMPT = f"""
+        You are an expert architectural analyst. First decide whether this drawing is a floor plan
+        (top-down view showing room layouts) or an elevation (side view showing the exterior facade
+        of a building), then analyze it accordingly.
+
+        Respond with ONE JSON object:
+        {{
+            "classification": {{"type": "floor_plan" or "elevation", "confidence": 0.0-1.0, "reasoning": "explanation"}},
+            ...all fields required by the matching instructions below, at the top level...
+        }}
+
+        IF IT IS A FLOOR PLAN, follow these instructions:
+        {FLOOR_PLAN_PROMPT}
+
+        IF IT IS AN ELEVATION, follow these instructions:
+        {ELEVATION_PROMPT}
+        """
+
+class ArchitecturalAnalyzer:
+    """
+    AI-powered architectural drawing analyzer that can:
+    1. Detect floor plans vs elevations
+    2. Identify interior/exterior walls, garage spaces, doors, windows
+    3. Generate proper layer names for AutoCAD
+    4. Trace walls and create AutoCAD-compatible output
+    """
+
+    # Drawing-type classification is a coarse, binary decision: it runs on the cheaper
+    # model with the API's low-detail (512 px) image path and a small output budget.
+    # The thumbnail matches the low-detail size, so no discarded pixels are uploaded
+    TYPE_MODEL = "gpt-4o-mini"
+    TYPE_THUMBNAIL_SIZE = 512
+    TYPE_MAX_COMPLETION_TOKENS = 150
+
+    # Images sent for detailed analysis are downscaled to this longest side and sent
+    # as JPEG; gpt-4o tiles inputs at about this resolution anyway, and returned pixel
+    # coordinates are scaled back to the original image
+    VISION_MAX_SIDE = 2048
+    VISION_JPEG_QUALITY = 85
+
+    # Per-file results of _image_digest and _encode_for_vision, keyed by (path, mtime,
+    # size, step), so the several analysis steps of one drawing read and encode the
+    # file once; least recently used entries are evicted first
+    FILE_MEMO_SIZE = 32
+
+    # Part of every AI cache key; bump it whenever a prompt, model or the image
+    # encoding changes so results produced by the old version are no longer served
+    PROMPT_VERSION = 2
+
+    def __init__(self, cache: Optional[AnalysisCache] = None):
+        # On-disk cache of AI results keyed by image content hash
+        self.cache = cache if cache is not None else AnalysisCache()
+        self._file_memo: 'OrderedDict[tuple, object]' = OrderedDict()
+        self._file_memo_lock = threading.Lock()
+        self.layer_names = {
+            'basement': {
+                'interior': 'basement_interior_wall',
+                'exterior': 'basement_exterior_wall'
+            },
+            'main_floor': {
+                'interior': 'main_floor_interior_wall',
+                'exterior': 'main_floor_exterior_wall',
+                'garage': 'main_floor_garage_wall'
+            },
+            'second_floor': {
+                'interior': 'second_floor_interior_wall',
+                'exterior': 'second_floor_exterior_wall'
+            },
+            'doors': {
+                'front': 'front_door_main',
+                'back': 'back_door_main',
+                'patio': 'patio_door_main',
+                'garage': 'garage_door_main'
+            },
+            'windows': {
+                'front': 'front_window_main',
+                'back': 'back_window_main',
+                'side': 'side_window_main',
+                'door': 'door_window_main'
+            }
+        }
+
+    def _thumbnail(self, image_path: ImageSource, max_side: int) -> Image.Image:
+        """In-memory copy of the image with its longest side at most max_side pixels"""
+        if isinstance(image_path, Image.Image):
+            thumb = image_path.convert('RGB') if image_path.mode != 'RGB' else image_path.copy()
+        else:
+            with Image.open(image_path) as img:
+                img.draft('RGB', (max_side, max_side))  # JPEG: decode at reduced scale
+                thumb = img.convert('RGB')
+        thumb.thumbnail((max_side, max_side), Image.Resampling.BILINEAR)
+        return thumb
+
+    def _memoized(self, image_path: ImageSource, step: tuple, compute):
+        """
+        Return compute() for an image file, reusing the result while the file is
+        unchanged. In-memory images are not memoized.
+        """
+        if isinstance(image_path, Image.Image):
+            return compute()
+        stat = os.stat(image_path)
+        key = (os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size) + step
+        with self._file_memo_lock:
+            cached = self._file_memo.get(key)
+            if cached is not None:
+                self._file_memo.move_to_end(key)
+        if cached is not None:
+            return cached
+
+        value = compute()
+
+        with self._file_memo_lock:
+            self._file_memo[key] = value
+            self._file_memo.move_to_end(key)
+            while len(self._file_memo) > self.FILE_MEMO_SIZE:
+                self._file_memo.popitem(last=False)
+        return value
+
+    def _encode_for_vision(self, image_path: ImageSource, max_side: int) -> Tuple[str, float]:
+        """
+        Downscale the image to at most max_side pixels and base64-encode it as JPEG.
+
+        Returns:
+            (base64 string, scale of the encoded image relative to the original)
+        """
+        return self._memoized(image_path, ('vision', max_side),
+                              lambda: self._encode_for_vision_uncached(image_path, max_side))
+
+    def _encode_for_vision_uncached(self, image_path: ImageSource, max_side: int) -> Tuple[str, float]:
+        if isinstance(image_path, Image.Image):
+            width = image_path.width
+        else:
+            with Image.open(image_path) as img:
+                width = img.width
+        thumb = self._thumbnail(image_path, max_side)
+        buffer = io.BytesIO()
+        thumb.save(buffer, format="JPEG", quality=self.VISION_JPEG_QUALITY)
+        return base64.b64encode(buffer.getbuffer()).decode('ascii'), thumb.width / width
+
+    def _rescale_coordinates(self, items: List[Dict], factor: float):
+        """Scale each item's [x, y] 'coordinates' in place (e.g. back to original image pixels)"""
+        if factor == 1.0:
+            return
+        for item in items:
+            coords = item.get('coordinates') if isinstance(item, dict) else None
+            if isinstance(coords, list):
+                item['coordinates'] = [
+                    [v * factor for v in point] if isinstance(point, list) else point
+                    for point in coords
+                ]
+
+    def _image_digest(self, image_path: ImageSource) -> str:
+        """Content hash of an image file, or of an in-memory image's pixels"""
+        if isinstance(image_path, Image.Image):
+            digest = hashlib.sha256(f"{image_path.mode}:{image_path.width}x{image_path.height}:".encode())
+            digest.update(image_path.tobytes())
+            return digest.hexdigest()
+        return self._memoized(image_path, ('sha256',), lambda: hash_file(image_path))
+
+    def _cached_analysis(self, image_path: ImageSource, kind: str, compute, use_cache: bool = True) -> Dict:
+        """
+        Return the cached AI result of the given kind for this image, computing it on a miss.
+        Near-duplicate images of the same pixel size (results hold pixel coordinates)
+        reuse each other's results via the perceptual hash index.
+        """
+        key = AnalysisCache.make_key(self._image_digest(image_path), kind, self.PROMPT_VERSION)
+        if isinstance(image_path, Image.Image):
+            size = image_path.size
+        else:
+            with Image.open(image_path) as img:
+                size = img.size  # header-only read
+        namespace = AnalysisCache.make_key(kind, self.PROMPT_VERSION, "{}x{}".format(*size))
+
+        def image_phash() -> int:
+            if isinstance(image_path, Image.Image):
+                return perceptual_hash(image_path)
+            with Image.open(image_path) as img:
+                return perceptual_hash(img)
+
+        return self.cache.get_or_compute(key, compute, use_cache=use_cache,
+                                         phash=image_phash, namespace=namespace)
+
+    def analyze_drawing_type(self, image_path: ImageSource, use_cache: bool = True) -> Dict:
+        """
+        Determine if the drawing is a floor plan or elevation using AI.
+        Clear-cut sheets are classified by a cheap image-statistics check first.
+        """
+        return self._cached_analysis(
+            image_path, 'drawtype',
+            lambda: self._classify_drawing_type_heuristic(image_path)
+                    or self._analyze_drawing_type_uncached(image_path),
+            use_cache=use_cache
+        )
+
+    def _classify_drawing_type_heuristic(self, image_path: ImageSource) -> Optional[Dict]:
+        """
+        Classify obvious elevations from aspect ratio and edge orientation without the LLM.
+        A portrait sheet whose edge energy is dominated by horizontal edges (floor lines,
+        siding, roof lines) is taken as an elevation; anything else returns None so the
+        caller falls back to the AI classifier.
+        """
+        # Reduced decode is plenty for edge statistics and ~16x cheaper
+        if isinstance(image_path, Image.Image):
+            gray = np.asarray(image_path.convert('L').reduce(4))
+        else:
+            gray = cv2.imread(image_path, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+        if gray is None:
+            return None
+
+        height, width = gray.shape
+        aspect = height / width
+        if aspect <= 1.3:
+            return None
+
+        horizontal_edges = np.abs(cv2.Sobel(gray, cv2.CV_32F, 0, 1)).sum()
+        vertical_edges = np.abs(cv2.Sobel(gray, cv2.CV_32F, 1, 0)).sum()
+        if vertical_edges == 0:
+            return None
+
+        ratio = float(horizontal_edges / vertical_edges)
+        if ratio <= 2.0:
+            return None
+
+        return {
+            'type': 'elevation',
+            'confidence': 0.9,
+            'reasoning': f"Image heuristic: portrait sheet (aspect {aspect:.2f}) with "
+                         f"horizontal-edge dominance {ratio:.1f}x",
+            'source': 'heuristic'
+        }
+
+    def _analyze_drawing_type_uncached(self, image_path: ImageSource) -> Dict:
+        if not openai:
+            raise Exception("OpenAI API key not configured. Please set up your OpenAI API key to use AI analysis features.")
+
+        base64_image, _ = self._encode_for_vision(image_path, self.TYPE_THUMBNAIL_SIZE)
+
+        response = openai.chat.completions.create(
+            model=self.TYPE_MODEL,
+            messages=[
+                {
+                    "role": "system",
+                    "content": DRAWING_TYPE_PROMPT
+                },
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": "Analyze this architectural drawing and determine if it's a floor plan or elevation view."
+                        },
+                        {
+                            "type": "image_url",
+                            "image_url": {"url": f"data:image/jpeg;base64,{base64_image}", "detail": "low"}
+                        }
+                    ]
+                }
+            ],
+            response_format={"type": "json_object"},
+            max_completion_tokens=self.TYPE_MAX_COMPLETION_TOKENS,
+            timeout=60.0
+        )
+
+        content = response.choices[0].message.content
+        if content is None:
+            raise ValueError("Empty response content from OpenAI API for drawing type analysis")
+        try:
+            result = json.loads(content)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Failed to decode JSON response from OpenAI API: {e}. Response content: {content}")
+        return result
+
+    def analyze_floor_plan(self, image_path: ImageSource, use_cache: bool = True) -> Dict:
+        """
+        Analyze floor plan to detect walls, rooms, and spaces with improved accuracy
+        """
+        return self._cached_analysis(image_path, 'floor',
+                                     lambda: self._analyze_floor_plan_uncached(image_path),
+                                     use_cache=use_cache)
+
+    def _analyze_floor_plan_uncached(self, image_path: ImageSource) -> Dict:
+        if not openai:
+            raise Exception("OpenAI API key not configured. Please set up your OpenAI API key to use AI analysis features.")
+
+        base64_image, scale = self._encode_for_vision(image_path, self.VISION_MAX_SIDE)
+
         response = openai.chat.completions.create(
             model="gpt-4o",
             messages=[
                 {
                     "role": "system",
-                    "content": prompt
+                    "content": FLOOR_PLAN_PROMPT
                 },
                 {
                     "role": "user",
@@ -234,6 +468,8 @@ class ArchitecturalAnalyzer:
             result = json.loads(content)
         except json.JSONDecodeError as e:
             raise ValueError(f"Failed to decode JSON response from OpenAI API: {e}. Response content: {content}")
+        if isinstance(result.get('spaces'), list):
+            self._rescale_coordinates(result['spaces'], 1.0 / scale)
         
         # Validate and clean the analysis result
         result = self._validate_and_fix_floor_plan_analysis(result)
@@ -311,59 +547,82 @@ class ArchitecturalAnalyzer:
         
         return analysis
 
-    def analyze_elevation(self, image_path: str) -> Dict:
+    def analyze_elevation(self, image_path: ImageSource, use_cache: bool = True) -> Dict:
         """
         Analyze elevation to detect doors, windows, and their dimensions
         """
+        return self._cached_analysis(image_path, 'elevation',
+                                     lambda: self._analyze_elevation_uncached(image_path),
+                                     use_cache=use_cache)
+
+    def _analyze_elevation_uncached(self, image_path: ImageSource) -> Dict:
         if not openai:
             raise Exception("OpenAI API key not configured. Please set up your OpenAI API key to use AI analysis features.")
 
-        base64_image = self.encode_image_to_base64(image_path)
+        base64_image, scale = self._encode_for_vision(image_path, self.VISION_MAX_SIDE)
 
-        prompt = """
-        You are an expert architectural analyst. Analyze this elevation drawing and identify:
+        response = openai.chat.completions.create(
+            model="gpt-4o",
+            messages=[
+                {
+                    "role": "system",
+                    "content": ELEVATION_PROMPT
+                },
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": "Analyze this elevation drawing for door and window detection."
+                        },
+                        {
+                            "type": "image_url",
+                            "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}
+                        }
+                    ]
+                }
+            ],
+            response_format={"type": "json_object"},
+            timeout=60.0
+        )
 
-        1. Elevation direction (front, back, left, right)
-        2. Doors (front door, patio door, etc.) with dimensions if visible
-        3. Windows with their locations and sizes
-        4. Door windows (windows within doors)
+        content = response.choices[0].message.content
+        if content is None:
+            raise ValueError("Empty response content from OpenAI API for elevation analysis")
+        try:
+            result = json.loads(content)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Failed to decode JSON response from OpenAI API: {e}. Response content: {content}")
+        if isinstance(result.get('elements'), list):
+            self._rescale_coordinates(result['elements'], 1.0 / scale)
+        return result
 
-        For each element, provide:
-        - Type (door/window)
-        - Subtype (front_door, patio_door, regular_window, door_window)
-        - Coordinates for drawing the element outline
-        - Dimensions if visible (e.g., "36x80" for doors)
-        - Floor level (main, basement, second, etc.)
+    def _analyze_combined_uncached(self, image_path: ImageSource) -> Tuple[Dict, Dict]:
+        """
+        Classify and analyze the drawing in a single vision call (COMBINED_PROMPT).
 
-        Respond in JSON format with:
-        {
-            "elevation_direction": "front/back/left/right",
-            "elements": [
-                {
-                    "type": "door/window",
-                    "subtype": "front_door/patio_door/window/door_window",
-                    "coordinates": [[x1,y1], [x2,y2], [x3,y3], [x4,y4]],
-                    "dimensions": "36x80" or null,
-                    "floor_level": "main/basement/second",
-                    "layer_name": "suggested_layer_name"
-                }
-            ]
-        }
+        Returns:
+            (drawing type analysis, floor plan or elevation analysis in the same
+             format as analyze_floor_plan / analyze_elevation)
         """
+        if not openai:
+            raise Exception("OpenAI API key not configured. Please set up your OpenAI API key to use AI analysis features.")
+
+        base64_image, scale = self._encode_for_vision(image_path, self.VISION_MAX_SIDE)
 
         response = openai.chat.completions.create(
             model="gpt-4o",
             messages=[
                 {
                     "role": "system",
-                    "content": prompt
+                    "content": COMBINED_PROMPT
                 },
                 {
                     "role": "user",
                     "content": [
                         {
                             "type": "text",
-                            "text": "Analyze this elevation drawing for door and window detection."
+                            "text": "Determine whether this architectural drawing is a floor plan or elevation view, then analyze it."
                         },
                         {
                             "type": "image_url",
@@ -378,28 +637,58 @@ class ArchitecturalAnalyzer:
 
         content = response.choices[0].message.content
         if content is None:
-            raise ValueError("Empty response content from OpenAI API for elevation analysis")
+            raise ValueError("Empty response content from OpenAI API for combined drawing analysis")
         try:
             result = json.loads(content)
         except json.JSONDecodeError as e:
             raise ValueError(f"Failed to decode JSON response from OpenAI API: {e}. Response content: {content}")
-        return result
 
-    def process_drawing(self, image_path: str) -> Dict:
+        type_analysis = result.pop('classification', None)
+        if not isinstance(type_analysis, dict) or type_analysis.get('type') not in ('floor_plan', 'elevation'):
+            raise ValueError(f"Combined analysis returned no valid drawing type: {type_analysis}")
+
+        if type_analysis['type'] == 'floor_plan':
+            if isinstance(result.get('spaces'), list):
+                self._rescale_coordinates(result['spaces'], 1.0 / scale)
+            result = self._validate_and_fix_floor_plan_analysis(result)
+        elif isinstance(result.get('elements'), list):
+            self._rescale_coordinates(result['elements'], 1.0 / scale)
+        return type_analysis, result
+
+    def process_drawing(self, image_path: ImageSource, use_cache: bool = True) -> Dict:
         """
         Main processing function that analyzes any architectural drawing
-        and returns comprehensive analysis with AutoCAD instructions
-        """
-        # First determine drawing type
-        drawing_type_analysis = self.analyze_drawing_type(image_path)
+        and returns comprehensive analysis with AutoCAD instructions.
+        Images may be given as file paths or in-memory PIL images.
 
-        analysis_type = drawing_type_analysis.get('type')
-        if analysis_type == 'floor_plan':
-            analysis = self.analyze_floor_plan(image_path)
-            analysis['drawing_type'] = 'floor_plan'
+        Set use_cache=False to force fresh AI calls (results are still re-cached).
+        A drawing seen for the first time costs one combined vision call; the type and
+        detailed results are cached separately, as by analyze_drawing_type and
+        analyze_floor_plan / analyze_elevation.
+        """
+        # Unless the type is known without the AI (cached or heuristic), one vision
+        # call classifies and analyzes the drawing; its detailed half is handed to the
+        # detail step below instead of making a second round-trip
+        combined = {}
+
+        def classify_drawing() -> Dict:
+            heuristic = self._classify_drawing_type_heuristic(image_path)
+            if heuristic:
+                return heuristic
+            type_analysis, combined['detail'] = self._analyze_combined_uncached(image_path)
+            return type_analysis
+
+        drawing_type_analysis = self._cached_analysis(image_path, 'drawtype', classify_drawing,
+                                                      use_cache=use_cache)
+
+        if drawing_type_analysis.get('type') == 'floor_plan':
+            kind, drawing_type, analyze = 'floor', 'floor_plan', self._analyze_floor_plan_uncached
         else:
-            analysis = self.analyze_elevation(image_path)
-            analysis['drawing_type'] = 'elevation'
+            kind, drawing_type, analyze = 'elevation', 'elevation', self._analyze_elevation_uncached
+        analysis = self._cached_analysis(image_path, kind,
+                                         lambda: combined.pop('detail', None) or analyze(image_path),
+                                         use_cache=use_cache)
+        analysis['drawing_type'] = drawing_type
 
         analysis['type_analysis'] = drawing_type_analysis
 
@@ -586,33 +875,33 @@ class ArchitecturalAnalyzer:
         Generate AutoCAD command sequence based on analysis results
         """
         commands = []
+        current_layer = None
+
+        def use_layer(layer_name: str):
+            # Create layer (and make it current); skipped when it is current already,
+            # so elements keep their order and consecutive ones share one -LAYER
+            nonlocal current_layer
+            if layer_name != current_layer:
+                commands.append(f"-LAYER M {layer_name}")
+                current_layer = layer_name
 
         if analysis['drawing_type'] == 'floor_plan':
             # Generate commands for wall tracing
             for space in analysis.get('spaces', []):
-                layer_name = space['layer_name']
+                use_layer(space['layer_name'])
                 coords = space['coordinates']
 
-                # Create layer
-                commands.append(f"-LAYER M {layer_name}")
-
                 # Draw polyline for wall tracing
                 if len(coords) > 1:
-                    polyline_cmd = "PLINE "
-                    for coord in coords:
-                        polyline_cmd += f"{coord[0]},{coord[1]} "
-                    polyline_cmd += "C"  # Close polyline
-                    commands.append(polyline_cmd)
+                    points = "".join([f"{coord[0]},{coord[1]} " for coord in coords])
+                    commands.append(f"PLINE {points}C")  # C closes the polyline
 
         elif analysis['drawing_type'] == 'elevation':
             # Generate commands for doors and windows
             for element in analysis.get('elements', []):
-                layer_name = element['layer_name']
+                use_layer(element['layer_name'])
                 coords = element['coordinates']
 
-                # Create layer
-                commands.append(f"-LAYER M {layer_name}")
-
                 # Draw rectangle for door/window
                 if len(coords) >= 4:
                     rect_cmd = f"RECTANG {coords[0][0]},{coords[0][1]} {coords[2][0]},{coords[2][1]}"
@@ -620,11 +909,26 @@ class ArchitecturalAnalyzer:
 
         return commands
 
+_analyzer = None
+_analyzer_lock = threading.Lock()
+
+def get_analyzer() -> ArchitecturalAnalyzer:
+    """
+    Return the shared ArchitecturalAnalyzer, creating it on first use.
+    The analyzer holds no per-drawing state, so one instance serves all requests.
+    """
+    global _analyzer
+    if _analyzer is None:
+        with _analyzer_lock:
+            if _analyzer is None:
+                _analyzer = ArchitecturalAnalyzer()
+    return _analyzer
+
 def main():
     """
     Example usage of the ArchitecturalAnalyzer
     """
-    analyzer = ArchitecturalAnalyzer()
+    analyzer = get_analyzer()
 
     # Example usage - you would replace this with actual file paths
     print("Architectural Drawing Analyzer initialized")
@@ -1,22 +1,48 @@
+import copy
 import ezdxf
+import logging
 import os
+import threading
+import time
 from typing import List, Dict, Tuple, Optional, Any, Union
 import cv2
 import numpy as np
 from PIL import Image
 import math
-from collections import defaultdict
+from collections import Counter, OrderedDict, defaultdict
+from .analysis_cache import hash_file
 from .enhanced_geometry_processor import EnhancedGeometryProcessor
+from .pdf_vector_extractor import PDFVectorExtractor
 from .wall_geometry_detector import WallGeometryDetector
 
+logger = logging.getLogger(__name__)
+
 class AutoCADIntegration:
     """
     Handles AutoCAD file operations and layer management
     """
     
+    # Layer color per element type (see get_layer_color)
+    LAYER_COLORS = {
+        'interior': 1,      # Red
+        'exterior': 2,      # Yellow
+        'garage_adjacent': 3, # Green
+        'door': 4,          # Cyan
+        'window': 5,        # Blue
+        'garage': 6         # Magenta
+    }
+    
+    # analyze_dxf_geometry results shared by all instances, keyed by
+    # (DXF content hash, AI-enhanced); least recently used entries are evicted first
+    GEOMETRY_CACHE_SIZE = 128
+    _geometry_cache: 'OrderedDict[Tuple[str, bool], Dict]' = OrderedDict()
+    _geometry_cache_lock = threading.Lock()
+    
     def __init__(self):
         self.current_doc = None
         self.modelspace = None
+        self.source_hash = None  # content hash of the loaded DXF while it is unmodified
+        self.created_layers = set()  # layers ensured by create_layer in the current document
         self.enhanced_processor = EnhancedGeometryProcessor()
         self.wall_detector = WallGeometryDetector()
     
@@ -27,22 +53,24 @@ class AutoCADIntegration:
             file_ext = os.path.splitext(file_path)[1].lower()
             
             if file_ext == '.dwg':
-                print("DWG files are not directly supported by ezdxf. Please convert to DXF format.")
+                logger.info("DWG files are not directly supported by ezdxf. Please convert to DXF format.")
                 return False
             
             # Type-safe access to ezdxf.readfile
             readfile_func = getattr(ezdxf, 'readfile', None)
             if readfile_func is None:
-                print("Error: ezdxf.readfile not available")
+                logger.error("ezdxf.readfile not available")
                 return False
             self.current_doc = readfile_func(file_path)
             self.modelspace = self.current_doc.modelspace()
-            print(f"Successfully loaded DXF file: {file_path}")
+            self.source_hash = hash_file(file_path)
+            self.created_layers = set()
+            logger.info("Successfully loaded DXF file: %s", file_path)
             return True
         except Exception as e:
-            print(f"Error loading file: {e}")
+            logger.error("Error loading file: %s", e)
             if 'DWG' in str(e).upper():
-                print("Note: DWG files require conversion to DXF format for processing.")
+                logger.warning("DWG files require conversion to DXF format for processing.")
             return False
     
     def create_new_dxf(self) -> bool:
@@ -51,21 +79,29 @@ class AutoCADIntegration:
             # Type-safe access to ezdxf.new
             new_func = getattr(ezdxf, 'new', None)
             if new_func is None:
-                print("Error: ezdxf.new not available")
+                logger.error("ezdxf.new not available")
                 return False
             self.current_doc = new_func('R2010')
             self.modelspace = self.current_doc.modelspace()
-            print("Created new DXF document")
+            self.source_hash = None
+            self.created_layers = set()
+            logger.info("Created new DXF document")
             return True
         except Exception as e:
-            print(f"Error creating new DXF document: {e}")
+            logger.error("Error creating new DXF document: %s", e)
             return False
     
     def create_layer(self, layer_name: str, color: int = 7, linetype: str = 'CONTINUOUS'):
-        """Create a new layer in the DXF file"""
+        """
+        Create a new layer in the DXF file.
+        Names are tracked in self.created_layers, so callers can report
+        them without walking the layer table (see list_layers).
+        """
         if self.current_doc is None:
-            print("No DXF document loaded")
+            logger.warning("No DXF document loaded")
             return False
+        if layer_name in self.created_layers:
+            return True
         
         try:
             layers = self.current_doc.layers
@@ -75,18 +111,20 @@ class AutoCADIntegration:
                 if hasattr(layer, 'dxf'):
                     layer.dxf.color = color
                     layer.dxf.linetype = linetype
-                print(f"Created layer: {layer_name} (color: {color})")
+                self.created_layers.add(layer_name)
+                logger.info("Created layer: %s (color: %s)", layer_name, color)
             else:
-                print(f"Layer {layer_name} already exists")
+                self.created_layers.add(layer_name)
+                logger.info("Layer %s already exists", layer_name)
             return True
         except Exception as e:
-            print(f"Error creating layer {layer_name}: {e}")
+            logger.error("Error creating layer %s: %s", layer_name, e)
             return False
     
     def draw_polyline(self, coordinates: List[Tuple[float, float]], layer_name: str = "0", closed: bool = False):
         """Draw a polyline on the specified layer"""
         if self.current_doc is None or self.modelspace is None:
-            print("No DXF document loaded")
+            logger.warning("No DXF document loaded")
             return False
         
         try:
@@ -100,16 +138,16 @@ class AutoCADIntegration:
             if closed and len(points_2d) > 2:
                 polyline.close(True)
             
-            print(f"Drew polyline with {len(coordinates)} points on layer {layer_name}")
+            logger.info("Drew polyline with %s points on layer %s", len(coordinates), layer_name)
             return True
         except Exception as e:
-            print(f"Error drawing polyline: {e}")
+            logger.error("Error drawing polyline: %s", e)
             return False
     
     def draw_rectangle(self, point1: Tuple[float, float], point2: Tuple[float, float], layer_name: str = "0"):
         """Draw a rectangle between two points"""
         if self.current_doc is None or self.modelspace is None:
-            print("No DXF document loaded")
+            logger.warning("No DXF document loaded")
             return False
         
         try:
@@ -127,13 +165,13 @@ class AutoCADIntegration:
             
             return self.draw_polyline(rectangle_points, layer_name)
         except Exception as e:
-            print(f"Error drawing rectangle: {e}")
+            logger.error("Error drawing rectangle: %s", e)
             return False
     
     def draw_line(self, start_point: Tuple[float, float], end_point: Tuple[float, float], layer_name: str = "0"):
         """Draw a single line"""
         if self.current_doc is None or self.modelspace is None:
-            print("No DXF document loaded")
+            logger.warning("No DXF document loaded")
             return False
         
         try:
@@ -142,27 +180,27 @@ class AutoCADIntegration:
             
             line = self.modelspace.add_line(start_3d, end_3d)
             line.dxf.layer = layer_name
-            print(f"Drew line from {start_point} to {end_point} on layer {layer_name}")
+            logger.info("Drew line from %s to %s on layer %s", start_point, end_point, layer_name)
             return True
         except Exception as e:
-            print(f"Error drawing line: {e}")
+            logger.error("Error drawing line: %s", e)
             return False
     
     def draw_arc(self, center: Tuple[float, float], radius: float, start_angle: float, 
                  end_angle: float, layer_name: str = "0"):
         """Draw an arc"""
         if self.current_doc is None or self.modelspace is None:
-            print("No DXF document loaded")
+            logger.warning("No DXF document loaded")
             return False
         
         try:
             center_3d = (center[0], center[1], 0)
             arc = self.modelspace.add_arc(center_3d, radius, start_angle, end_angle)
             arc.dxf.layer = layer_name
-            print(f"Drew arc with radius {radius} on layer {layer_name}")
+            logger.info("Drew arc with radius %s on layer %s", radius, layer_name)
             return True
         except Exception as e:
-            print(f"Error drawing arc: {e}")
+            logger.error("Error drawing arc: %s", e)
             return False
     
     def insert_pdf_as_geometry(self, pdf_path: str, image_path: str, analysis_result: Dict, page_num: int = 0):
@@ -171,20 +209,14 @@ class AutoCADIntegration:
         Falls back to image if no vector content is available
         """
         if self.current_doc is None or self.modelspace is None:
-            print("No DXF document loaded")
+            logger.warning("No DXF document loaded")
             return False
         
         try:
-            import cv2
-            import numpy as np
-            from PIL import Image
-            import os
-            from .pdf_vector_extractor import PDFVectorExtractor
-            
             # Load image for dimensions
             img = cv2.imread(image_path)
             if img is None:
-                print(f"Could not load image: {image_path}")
+                logger.warning("Could not load image: %s", image_path)
                 return False
             
             # Get image dimensions
@@ -195,7 +227,7 @@ class AutoCADIntegration:
             dxf_width = img_width * scale_factor
             dxf_height = img_height * scale_factor
             
-            print(f"Processing {img_width}x{img_height} drawing for DXF ({dxf_width:.1f}x{dxf_height:.1f} units)")
+            logger.info("Processing %sx%s drawing for DXF (%.1fx%.1f units)", img_width, img_height, dxf_width, dxf_height)
             
             # Create ORIGINAL_DRAWING layer
             self.create_layer("ORIGINAL_DRAWING", color=8, linetype='CONTINUOUS')
@@ -206,8 +238,8 @@ class AutoCADIntegration:
             
             vector_extracted = False
             if has_vector:
-                print(f"PDF has vector content: {vector_msg}")
-                print("Extracting actual vector paths from PDF...")
+                logger.info("PDF has vector content: %s", vector_msg)
+                logger.info("Extracting actual vector paths from PDF...")
                 
                 extraction_result = vector_extractor.extract_vector_paths_to_dxf(
                     pdf_path, 
@@ -218,18 +250,18 @@ class AutoCADIntegration:
                 
                 if extraction_result.get('success'):
                     vector_count = extraction_result.get('vector_count', 0)
-                    print(f"✅ Successfully extracted {vector_count} vector entities from PDF")
-                    print(f"   All actual drawing content is now in the DXF on ORIGINAL_DRAWING layer")
+                    logger.info("✅ Successfully extracted %s vector entities from PDF", vector_count)
+                    logger.info("   All actual drawing content is now in the DXF on ORIGINAL_DRAWING layer")
                     vector_extracted = True
                 else:
-                    print(f"⚠️ Vector extraction failed: {extraction_result.get('error', 'Unknown error')}")
+                    logger.warning("⚠️ Vector extraction failed: %s", extraction_result.get('error', 'Unknown error'))
             else:
-                print(f"⚠️ {vector_msg}")
-                print("   PDF appears to be a raster/scanned document")
+                logger.warning("⚠️ %s", vector_msg)
+                logger.info("   PDF appears to be a raster/scanned document")
             
             # If no vector content, fall back to image reference
             if not vector_extracted:
-                print("Falling back to image reference method...")
+                logger.info("Falling back to image reference method...")
                 
                 try:
                     # Get absolute path for image
@@ -240,9 +272,9 @@ class AutoCADIntegration:
                     image_entity = self.modelspace.add_image(image_def=image_def, insert=(0, 0), size_in_units=(dxf_width, dxf_height))
                     image_entity.dxf.layer = "ORIGINAL_DRAWING"
                     
-                    print(f"✅ Inserted raster image as reference on ORIGINAL_DRAWING layer")
+                    logger.info("✅ Inserted raster image as reference on ORIGINAL_DRAWING layer")
                 except Exception as e:
-                    print(f"⚠️ Could not insert image reference: {e}")
+                    logger.warning("⚠️ Could not insert image reference: %s", e)
             
             # Process image for boundary detection (for fallback edge detection if needed)
             try:
@@ -266,9 +298,9 @@ class AutoCADIntegration:
                 self._scale_factor = scale_factor
                 self._dxf_dimensions = (dxf_width, dxf_height)
                 
-                print(f"Prepared {len(contours)} contours for boundary detection")
+                logger.info("Prepared %s contours for boundary detection", len(contours))
             except Exception as e:
-                print(f"Note: Edge detection not available: {e}")
+                logger.warning("Edge detection not available: %s", e)
                 # Initialize empty contours for fallback
                 self._all_contours = []
                 self._img_dimensions = (img_width, img_height)
@@ -278,10 +310,8 @@ class AutoCADIntegration:
             return True
             
         except Exception as e:
-            print(f"Warning: Could not insert PDF drawing: {e}")
-            import traceback
-            traceback.print_exc()
-            print("Continuing without original drawing geometry")
+            logger.exception("Could not insert PDF drawing: %s", e)
+            logger.info("Continuing without original drawing geometry")
             return False
     
     def detect_wall_boundaries_from_ai(self, analysis_result: Dict, image_dimensions: tuple, trace_options: Dict) -> Dict:
@@ -294,7 +324,7 @@ class AutoCADIntegration:
         dxf_width = img_width * scale_factor
         dxf_height = img_height * scale_factor
         
-        print(f"Converting AI coordinates from {img_width}x{img_height} pixels to {dxf_width:.1f}x{dxf_height:.1f} DXF units")
+        logger.info("Converting AI coordinates from %sx%s pixels to %.1fx%.1f DXF units", img_width, img_height, dxf_width, dxf_height)
         
         def convert_ai_coords_to_dxf(ai_coords):
             """Convert AI pixel coordinates to DXF coordinates"""
@@ -339,7 +369,7 @@ class AutoCADIntegration:
                     'type': 'interior'
                 })
         
-        print(f"Extracted from AI: {len(outer_boundaries)} exterior boundaries, {len(inner_boundaries)} interior boundaries")
+        logger.info("Extracted from AI: %s exterior boundaries, %s interior boundaries", len(outer_boundaries), len(inner_boundaries))
         
         return {
             'outer_boundaries': outer_boundaries,
@@ -352,23 +382,23 @@ class AutoCADIntegration:
         This finds the REAL inner and outer edges of walls, not just room perimeters
         """
         if self.current_doc is None:
-            print("No DXF document loaded for wall detection")
+            logger.warning("No DXF document loaded for wall detection")
             return {'outer_boundaries': [], 'inner_boundaries': []}
         
-        print("Detecting wall boundaries from vector geometry...")
+        logger.info("Detecting wall boundaries from vector geometry...")
         
         # Extract line entities from the DXF document
         lines = self.wall_detector.extract_lines_from_dxf(self.current_doc, "ORIGINAL_DRAWING")
         
         if len(lines) < 10:
-            print("Not enough lines for wall detection, falling back to contour method")
+            logger.info("Not enough lines for wall detection, falling back to contour method")
             return self.detect_wall_boundaries_from_geometry_fallback()
         
         # Find parallel line pairs (potential walls)
         parallel_pairs = self.wall_detector.find_parallel_line_pairs()
         
         if not parallel_pairs:
-            print("No parallel line pairs found, falling back to contour method")
+            logger.info("No parallel line pairs found, falling back to contour method")
             return self.detect_wall_boundaries_from_geometry_fallback()
         
         # Trace wall boundaries (inner and outer edges)
@@ -394,7 +424,7 @@ class AutoCADIntegration:
                     'type': 'interior'
                 })
         
-        print(f"Vector geometry detection: {len(outer_boundaries)} exterior, {len(inner_boundaries)} interior wall boundaries")
+        logger.info("Vector geometry detection: %s exterior, %s interior wall boundaries", len(outer_boundaries), len(inner_boundaries))
         
         return {
             'outer_boundaries': outer_boundaries,
@@ -404,17 +434,15 @@ class AutoCADIntegration:
     def detect_wall_boundaries_from_geometry_fallback(self) -> Dict:
         """Fallback: Detect outer and inner wall boundaries from contours (old method)"""
         if not hasattr(self, '_all_contours'):
-            print("No contours available for boundary detection")
+            logger.info("No contours available for boundary detection")
             return {'outer_boundaries': [], 'inner_boundaries': []}
         
-        import cv2
-        import numpy as np
         
         contours = self._all_contours
         img_width, img_height = self._img_dimensions
         scale_factor = self._scale_factor
         
-        print(f"Analyzing {len(contours)} contours for wall boundaries (fallback method)...")
+        logger.info("Analyzing %s contours for wall boundaries (fallback method)...", len(contours))
         
         # Calculate contour areas and sort by size
         contour_data = []
@@ -448,7 +476,7 @@ class AutoCADIntegration:
                     'area': largest['area'],
                     'type': 'exterior'
                 })
-                print(f"Detected outer boundary: {len(points)} points, area {largest['area']:.0f}")
+                logger.info("Detected outer boundary: %s points, area %.0f", len(points), largest['area'])
             
             # Inner boundaries (next largest contours that are enclosed)
             max_inner_boundaries = 5
@@ -466,7 +494,7 @@ class AutoCADIntegration:
                         'area': data['area'],
                         'type': 'interior'
                     })
-                    print(f"Detected inner boundary {i+1}: {len(points)} points, area {data['area']:.0f}")
+                    logger.info("Detected inner boundary %s: %s points, area %.0f", i+1, len(points), data['area'])
         
         return {
             'outer_boundaries': outer_boundaries,
@@ -482,35 +510,35 @@ class AutoCADIntegration:
         for boundary in wall_boundaries.get('outer_boundaries', []):
             if self.draw_polyline(boundary['points'], "EXTERIOR_WALL_HIGHLIGHT", closed=True):
                 commands_executed += 1
-                print(f"Drew exterior wall boundary with {len(boundary['points'])} points")
+                logger.info("Drew exterior wall boundary with %s points", len(boundary['points']))
         
         # Draw inner boundaries (interior walls) in cyan
         self.create_layer("INTERIOR_WALL_HIGHLIGHT", color=4, linetype='CONTINUOUS')
         for boundary in wall_boundaries.get('inner_boundaries', []):
             if self.draw_polyline(boundary['points'], "INTERIOR_WALL_HIGHLIGHT", closed=True):
                 commands_executed += 1
-                print(f"Drew interior wall boundary with {len(boundary['points'])} points")
+                logger.info("Drew interior wall boundary with %s points", len(boundary['points']))
         
         return commands_executed
     
     def save_dxf(self, output_path: str):
         """Save the current DXF document"""
         if self.current_doc is None:
-            print("No DXF document to save")
+            logger.warning("No DXF document to save")
             return False
         
         try:
             self.current_doc.saveas(output_path)
-            print(f"Saved DXF file to: {output_path}")
+            logger.info("Saved DXF file to: %s", output_path)
             return True
         except Exception as e:
-            print(f"Error saving DXF file: {e}")
+            logger.error("Error saving DXF file: %s", e)
             return False
     
     def list_layers(self):
         """List all layers in the current document"""
         if self.current_doc is None:
-            print("No DXF document loaded")
+            logger.warning("No DXF document loaded")
             return []
         
         layers = []
@@ -528,7 +556,7 @@ class AutoCADIntegration:
         Execute AutoCAD drawing commands based on enhanced analysis results
         """
         if self.current_doc is None:
-            print("No DXF document loaded. Creating new document.")
+            logger.info("No DXF document loaded. Creating new document.")
             self.create_new_dxf()
         
         commands_executed = 0
@@ -540,21 +568,23 @@ class AutoCADIntegration:
             if commands_count > 0:
                 return commands_count
             else:
-                print("Warning: Enhanced commands executed but drew nothing. Falling back to legacy processing...")
+                logger.warning("Enhanced commands executed but drew nothing. Falling back to legacy processing...")
         
         # Fallback to legacy command processing
+        layers_created = set()
         
         if analysis_result['drawing_type'] == 'floor_plan':
-            print("Processing floor plan analysis...")
+            logger.info("Processing floor plan analysis...")
             
             # Process spaces (walls)
             for space in analysis_result.get('spaces', []):
                 layer_name = space['layer_name']
                 coordinates = space['coordinates']
                 
-                # Create layer
-                color = self.get_layer_color(space['type'])
-                self.create_layer(layer_name, color)
+                # Create layer once (first element's type sets its color)
+                if layer_name not in layers_created:
+                    self.create_layer(layer_name, self.get_layer_color(space['type']))
+                    layers_created.add(layer_name)
                 
                 # Draw the wall trace
                 if len(coordinates) > 1:
@@ -562,16 +592,17 @@ class AutoCADIntegration:
                     commands_executed += 1
         
         elif analysis_result['drawing_type'] == 'elevation':
-            print("Processing elevation analysis...")
+            logger.info("Processing elevation analysis...")
             
             # Process doors and windows
             for element in analysis_result.get('elements', []):
                 layer_name = element['layer_name']
                 coordinates = element['coordinates']
                 
-                # Create layer
-                color = self.get_layer_color(element['type'])
-                self.create_layer(layer_name, color)
+                # Create layer once (first element's type sets its color)
+                if layer_name not in layers_created:
+                    self.create_layer(layer_name, self.get_layer_color(element['type']))
+                    layers_created.add(layer_name)
                 
                 # Draw rectangle for door/window
                 if len(coordinates) >= 4:
@@ -580,7 +611,7 @@ class AutoCADIntegration:
                     self.draw_rectangle(point1, point2, layer_name)
                     commands_executed += 1
         
-        print(f"Executed {commands_executed} drawing commands")
+        logger.info("Executed %s drawing commands", commands_executed)
         return commands_executed
     
     def _execute_enhanced_commands(self, drawing_commands: List[Dict]) -> int:
@@ -588,9 +619,8 @@ class AutoCADIntegration:
         Execute enhanced drawing commands from the enhanced geometry processor
         """
         commands_executed = 0
-        layers_created = set()
         
-        print(f"Executing {len(drawing_commands)} enhanced drawing commands...")
+        logger.info("Executing %s enhanced drawing commands...", len(drawing_commands))
         
         for command in drawing_commands:
             try:
@@ -601,10 +631,8 @@ class AutoCADIntegration:
                     color = command.get('color', 7)
                     linetype = command.get('linetype', 'CONTINUOUS')
                     
-                    if layer_name and layer_name not in layers_created:
-                        success = self.create_layer(layer_name, color, linetype)
-                        if success:
-                            layers_created.add(layer_name)
+                    if layer_name and layer_name not in self.created_layers:
+                        if self.create_layer(layer_name, color, linetype):
                             commands_executed += 1
                 
                 elif action == 'draw_line':
@@ -650,19 +678,18 @@ class AutoCADIntegration:
                             commands_executed += 1
                 
                 else:
-                    print(f"Unknown command action: {action}")
+                    logger.warning("Unknown command action: %s", action)
             
             except Exception as e:
-                print(f"Error executing command {action}: {e}")
+                logger.error("Error executing command %s: %s", action, e)
         
-        print(f"Successfully executed {commands_executed} enhanced drawing commands")
+        logger.info("Successfully executed %s enhanced drawing commands", commands_executed)
         return commands_executed
     
     def export_measurements(self, measurements: Dict, output_dir: str = 'outputs') -> Dict[str, str]:
         """
         Export measurements to CSV and JSON formats
         """
-        import os
         os.makedirs(output_dir, exist_ok=True)
         
         csv_path = os.path.join(output_dir, 'measurements.csv')
@@ -682,15 +709,7 @@ class AutoCADIntegration:
     
     def get_layer_color(self, element_type: str) -> int:
         """Get appropriate color for different element types"""
-        color_map = {
-            'interior': 1,      # Red
-            'exterior': 2,      # Yellow
-            'garage_adjacent': 3, # Green
-            'door': 4,          # Cyan
-            'window': 5,        # Blue
-            'garage': 6         # Magenta
-        }
-        return color_map.get(element_type, 7)  # Default white
+        return self.LAYER_COLORS.get(element_type, 7)  # Default white
 
     def extract_geometric_entities(self) -> Dict[str, List]:
         """
@@ -698,7 +717,7 @@ class AutoCADIntegration:
         Returns a dictionary with entity types and their data
         """
         if self.current_doc is None or self.modelspace is None:
-            print("No DXF document loaded")
+            logger.warning("No DXF document loaded")
             return {}
         
         # Use stateless extraction to avoid state corruption issues
@@ -814,18 +833,19 @@ class AutoCADIntegration:
             total_extracted = (len(entities['lines']) + len(entities['lwpolylines']) + 
                              len(entities['polylines']) + len(entities['arcs']) + len(entities['circles']))
             
-            print(f"Extracted {len(entities['lines'])} lines, {len(entities['lwpolylines'])} lwpolylines, "
-                  f"{len(entities['polylines'])} polylines, {len(entities['arcs'])} arcs, "
-                  f"{len(entities['circles'])} circles (total: {total_extracted} from {entity_count} entities)")
+            logger.info("Extracted %s lines, %s lwpolylines, %s polylines, %s arcs, %s circles "
+                        "(total: %s from %s entities)",
+                        len(entities['lines']), len(entities['lwpolylines']), len(entities['polylines']),
+                        len(entities['arcs']), len(entities['circles']), total_extracted, entity_count)
             
             # Diagnostic: warn if no entities were extracted from a non-empty modelspace
             if entity_count > 0 and total_extracted == 0:
-                print(f"WARNING: Iterated over {entity_count} entities but extracted 0. Check entity types.")
+                logger.warning("Iterated over %s entities but extracted 0. Check entity types.", entity_count)
                 # Check for PDF underlays which are not supported
                 pdf_count = sum(1 for e in modelspace if e.dxftype() == 'PDFUNDERLAY')
                 if pdf_count > 0:
                     error_msg = f"This DXF contains {pdf_count} PDF reference(s), not actual CAD geometry. Please explode/convert the PDF to CAD entities in AutoCAD before uploading, or use a DXF file with actual geometric entities (lines, polylines, arcs, etc.)."
-                    print(f"ERROR: {error_msg}")
+                    logger.error("%s", error_msg)
                     # Store error in entities dict to be surfaced to UI
                     entities['error'] = error_msg
                     entities['pdf_underlay_detected'] = True
@@ -833,9 +853,7 @@ class AutoCADIntegration:
             return entities
 
         except Exception as e:
-            print(f"Error extracting geometric entities: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error extracting geometric entities: %s", e)
             return {}
 
 
@@ -851,13 +869,13 @@ class AutoCADIntegration:
         }
 
         try:
-            print("Analyzing spatial relationships...")
+            logger.info("Analyzing spatial relationships...")
             
             # Combine all linear entities (lines and polylines) for wall analysis
             wall_segments = []
             
             # Add lines as wall segments
-            print(f"Processing {len(entities.get('lines', []))} lines...")
+            logger.info("Processing %s lines...", len(entities.get('lines', [])))
             for line in entities.get('lines', []):
                 wall_segments.append({
                     'start': line['start'],
@@ -869,7 +887,7 @@ class AutoCADIntegration:
             
             # Add polyline segments
             total_polylines = len(entities.get('lwpolylines', [])) + len(entities.get('polylines', []))
-            print(f"Processing {total_polylines} polylines...")
+            logger.info("Processing %s polylines...", total_polylines)
             
             for polyline in entities.get('lwpolylines', []) + entities.get('polylines', []):
                 points = polyline['points']
@@ -884,14 +902,14 @@ class AutoCADIntegration:
                         'type': 'polyline_segment'
                     })
 
-            print(f"Total wall segments to analyze: {len(wall_segments)}")
+            logger.info("Total wall segments to analyze: %s", len(wall_segments))
             
             # Group wall segments by connectivity and orientation
-            print("Grouping connected wall segments...")
+            logger.info("Grouping connected wall segments...")
             wall_groups = self._group_connected_walls(wall_segments)
             analysis['wall_groups'] = wall_groups
 
-            print("Calculating building bounds...")
+            logger.info("Calculating building bounds...")
             # Find building bounds
             all_points = []
             for segment in wall_segments:
@@ -910,7 +928,7 @@ class AutoCADIntegration:
                 }
 
             # Identify enclosed areas from closed polylines
-            print("Identifying enclosed areas...")
+            logger.info("Identifying enclosed areas...")
             for polyline in entities.get('lwpolylines', []) + entities.get('polylines', []):
                 if polyline.get('closed', False) and polyline.get('area', 0) > 0:
                     analysis['enclosed_areas'].append({
@@ -919,13 +937,11 @@ class AutoCADIntegration:
                         'layer': polyline['layer']
                     })
 
-            print(f"Spatial analysis complete: {len(wall_groups)} wall groups, {len(analysis['enclosed_areas'])} enclosed areas")
+            logger.info("Spatial analysis complete: %s wall groups, %s enclosed areas", len(wall_groups), len(analysis['enclosed_areas']))
             return analysis
 
         except Exception as e:
-            print(f"Error analyzing spatial relationships: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error analyzing spatial relationships: %s", e)
             return analysis
 
     def _group_connected_walls(self, wall_segments: List[Dict]) -> List[Dict]:
@@ -935,12 +951,12 @@ class AutoCADIntegration:
 
         # Use spatial indexing for datasets larger than 1000 segments
         if len(wall_segments) > 1000:
-            print(f"Large dataset detected ({len(wall_segments)} segments). Using spatial indexing optimization.")
+            logger.info("Large dataset detected (%s segments). Using spatial indexing optimization.", len(wall_segments))
             return self._group_connected_walls_spatial(wall_segments)
 
         # For very large datasets, use simplified grouping
         if len(wall_segments) > 5000:
-            print(f"Very large dataset detected ({len(wall_segments)} segments). Using simplified grouping.")
+            logger.info("Very large dataset detected (%s segments). Using simplified grouping.", len(wall_segments))
             return self._group_connected_walls_simplified(wall_segments)
 
         groups = []
@@ -948,7 +964,6 @@ class AutoCADIntegration:
         tolerance = 1.0
         max_iterations = min(len(wall_segments), 1000)  # Cap iterations to prevent infinite loops
 
-        import time
         start_time = time.time()
         timeout_seconds = 30  # 30 second timeout
 
@@ -958,7 +973,7 @@ class AutoCADIntegration:
 
             # Check timeout
             if time.time() - start_time > timeout_seconds:
-                print(f"Wall grouping timed out after {timeout_seconds} seconds. Creating individual groups for remaining segments.")
+                logger.warning("Wall grouping timed out after %s seconds. Creating individual groups for remaining segments.", timeout_seconds)
                 # Create individual groups for remaining segments
                 for j in range(i, len(wall_segments)):
                     if j not in used_segments:
@@ -988,7 +1003,7 @@ class AutoCADIntegration:
                 
                 # Check timeout periodically
                 if iterations % 100 == 0 and time.time() - start_time > timeout_seconds:
-                    print(f"Wall grouping timed out during group {len(groups)+1}")
+                    logger.warning("Wall grouping timed out during group %s", len(groups)+1)
                     break
                 
                 for j, other_segment in enumerate(wall_segments):
@@ -1007,7 +1022,7 @@ class AutoCADIntegration:
 
             groups.append(group)
 
-        print(f"Grouped {len(wall_segments)} segments into {len(groups)} wall groups in {time.time() - start_time:.2f} seconds")
+        logger.info("Grouped %s segments into %s wall groups in %.2f seconds", len(wall_segments), len(groups), time.time() - start_time)
         return groups
 
     def _segments_connected(self, group_segments: List[Dict], segment: Dict, tolerance: float) -> bool:
@@ -1052,7 +1067,7 @@ class AutoCADIntegration:
 
     def _group_connected_walls_simplified(self, wall_segments: List[Dict]) -> List[Dict]:
         """Simplified grouping for very large datasets - groups by layer and proximity only"""
-        print(f"Using simplified grouping for {len(wall_segments)} segments...")
+        logger.info("Using simplified grouping for %s segments...", len(wall_segments))
         
         # Group segments by layer first
         layer_groups = defaultdict(list)
@@ -1084,7 +1099,7 @@ class AutoCADIntegration:
                     }
                     groups.append(chunk_group)
         
-        print(f"Simplified grouping created {len(groups)} groups from {len(layer_groups)} layers")
+        logger.info("Simplified grouping created %s groups from %s layers", len(groups), len(layer_groups))
         return groups
 
     def _group_connected_walls_spatial(self, wall_segments: List[Dict]) -> List[Dict]:
@@ -1159,7 +1174,7 @@ class AutoCADIntegration:
 
             groups.append(group)
 
-        print(f"Spatial indexing: Grouped {len(wall_segments)} segments into {len(groups)} wall groups")
+        logger.info("Spatial indexing: Grouped %s segments into %s wall groups", len(wall_segments), len(groups))
         return groups
 
     def _segments_directly_connected(self, seg1: Dict, seg2: Dict, tolerance: float) -> bool:
@@ -1244,11 +1259,11 @@ class AutoCADIntegration:
                     'segment_count': len(group['segments'])
                 })
 
-            print(f"Classified {len(classified_walls)} wall groups")
+            logger.info("Classified %s wall groups", len(classified_walls))
             return classified_walls
 
         except Exception as e:
-            print(f"Error classifying wall types: {e}")
+            logger.error("Error classifying wall types: %s", e)
             return classified_walls
 
     def _generate_wall_trace_coordinates(self, wall_group: Dict) -> List[Tuple[float, float]]:
@@ -1274,31 +1289,61 @@ class AutoCADIntegration:
 
         return unique_coords
 
-    def analyze_dxf_geometry(self, analyzer=None) -> Dict:
+    def analyze_dxf_geometry(self, analyzer=None, use_cache: bool = True) -> Dict:
         """
-        Main method to analyze DXF geometry using enhanced processing
+        Main method to analyze DXF geometry using enhanced processing.
+        Results for a file loaded with load_dxf_file are cached by its content hash,
+        so re-uploads of the same DXF skip the analysis (and any AI calls);
+        call it before drawing into the document, or pass use_cache=False.
+        Basic fallback results, and results whose AI step failed, are not cached,
+        so a later call retries the full analysis.
         """
-        print("Starting enhanced DXF geometric analysis...")
+        key = (self.source_hash, analyzer is not None)
+        if use_cache and self.source_hash is not None:
+            with self._geometry_cache_lock:
+                cached = self._geometry_cache.get(key)
+                if cached is not None:
+                    self._geometry_cache.move_to_end(key)
+            if cached is not None:
+                logger.info("Using cached DXF geometric analysis")
+                return copy.deepcopy(cached)
+        
+        result, complete = self._analyze_dxf_geometry_uncached(analyzer)
+        
+        if complete and self.source_hash is not None:
+            with self._geometry_cache_lock:
+                self._geometry_cache[key] = copy.deepcopy(result)
+                self._geometry_cache.move_to_end(key)
+                while len(self._geometry_cache) > self.GEOMETRY_CACHE_SIZE:
+                    self._geometry_cache.popitem(last=False)
+        return result
+    
+    def _analyze_dxf_geometry_uncached(self, analyzer=None) -> Tuple[Dict, bool]:
+        """Returns (analysis, whether it is complete: enhanced and, if requested, AI-enhanced)"""
+        logger.info("Starting enhanced DXF geometric analysis...")
         
         # Use the enhanced geometry processor for comprehensive analysis
         try:
             analysis_result = self.enhanced_processor.process_dxf_geometry(self, analyzer)
-            print("Enhanced geometric analysis completed successfully")
-            return analysis_result
+            logger.info("Enhanced geometric analysis completed successfully")
+            # A failed AI step (e.g. a timeout) leaves a geometry-only result
+            ai_failed = (analyzer is not None and
+                         analysis_result.get('analysis_metadata', {}).get('ai_enhanced') is False)
+            return analysis_result, not ai_failed
         except Exception as e:
-            print(f"Enhanced analysis failed: {e}. Falling back to basic analysis.")
-            return self._fallback_to_basic_analysis(analyzer)
+            logger.warning("Enhanced analysis failed: %s. Falling back to basic analysis.", e)
+            return self._fallback_to_basic_analysis(analyzer), False
     
     def _fallback_to_basic_analysis(self, analyzer=None) -> Dict:
         """
         Fallback to the original analysis method if enhanced processing fails
         """
-        print("Using fallback analysis method...")
+        logger.info("Using fallback analysis method...")
         
         # Step 1: Extract all geometric entities
         entities = self.extract_geometric_entities()
         if not entities:
-            print("No geometric entities found")
+            logger.info("No geometric entities found")
             return self._create_fallback_analysis()
 
         # Step 2: Analyze spatial relationships
@@ -1306,12 +1351,11 @@ class AutoCADIntegration:
         
         # Step 3: Use AI to enhance analysis if analyzer is provided and API key is available
         if analyzer:
-            print("Checking AI analysis availability...")
+            logger.info("Checking AI analysis availability...")
             try:
                 # Check if OpenAI API key is available
-                import os
                 if os.environ.get("OPENAI_API_KEY"):
-                    print("Integrating AI analysis with geometric data...")
+                    logger.info("Integrating AI analysis with geometric data...")
                     # Prepare metadata for AI analysis
                     analysis_metadata = {
                         'entities_extracted': {
@@ -1328,18 +1372,18 @@ class AutoCADIntegration:
                     try:
                         enhanced_analysis = analyzer.analyze_geometric_data(analysis_metadata, spatial_analysis)
                         spatial_analysis = enhanced_analysis
-                        print("✅ AI analysis integration completed successfully")
+                        logger.info("✅ AI analysis integration completed successfully")
                     except Exception as e:
                         if "timeout" in str(e).lower() or "timed out" in str(e).lower():
-                            print("⚠️ AI enhancement failed: Request timed out. Continuing with geometric analysis.")
+                            logger.warning("⚠️ AI enhancement failed: Request timed out. Continuing with geometric analysis.")
                         else:
-                            print(f"⚠️ AI enhancement failed: {e}. Continuing with geometric analysis.")
+                            logger.warning("⚠️ AI enhancement failed: %s. Continuing with geometric analysis.", e)
                         # Continue with geometric-only analysis - this is expected fallback behavior
                 else:
-                    print("OpenAI API key not configured. Proceeding with geometric-only analysis.")
+                    logger.info("OpenAI API key not configured. Proceeding with geometric-only analysis.")
                 
             except Exception as e:
-                print(f"AI analysis failed: {str(e)}. Proceeding with geometric-only analysis.")
+                logger.warning("AI analysis failed: %s. Proceeding with geometric-only analysis.", e)
                 # Continue with geometric analysis instead of failing completely
         
         # Step 4: Classify wall types (potentially enhanced by AI)
@@ -1383,7 +1427,7 @@ class AutoCADIntegration:
                     }
                 })
 
-        print(f"Analysis complete: found {len(result['spaces'])} wall spaces")
+        logger.info("Analysis complete: found %s wall spaces", len(result['spaces']))
         return result
 
     def classify_wall_types_enhanced(self, analysis: Dict) -> List[Dict]:
@@ -1416,8 +1460,8 @@ class AutoCADIntegration:
                 
                 if ai_classification and ai_classification.get('confidence', 0) > 0.7:
                     wall_type = ai_classification.get('type', wall_type)
-                    print(f"AI override: Wall group {i} classified as {wall_type} "
-                          f"(confidence: {ai_classification.get('confidence', 0):.2f})")
+                    logger.info("AI override: Wall group %s classified as %s (confidence: %.2f)",
+                                i, wall_type, ai_classification.get('confidence', 0))
 
                 # Generate coordinates for wall tracing
                 coordinates = self._generate_wall_trace_coordinates(group)
@@ -1437,11 +1481,11 @@ class AutoCADIntegration:
 
                 classified_walls.append(wall_data)
 
-            print(f"Enhanced classification complete: {len(classified_walls)} wall groups")
+            logger.info("Enhanced classification complete: %s wall groups", len(classified_walls))
             return classified_walls
 
         except Exception as e:
-            print(f"Error in enhanced wall classification: {e}")
+            logger.error("Error in enhanced wall classification: %s", e)
             # Fall back to basic classification
             return self.classify_wall_types(analysis)
 
@@ -1450,7 +1494,7 @@ class AutoCADIntegration:
         Create clean, organized architectural element traces
         Instead of merging all walls into chaotic overlapping lines, create proper organized layers
         """
-        print(f"Creating organized architectural traces from {len(classified_walls)} wall groups...")
+        logger.info("Creating organized architectural traces from %s wall groups...", len(classified_walls))
         
         # Identify building perimeter (exterior boundary)
         exterior_perimeter = self._find_building_perimeter(classified_walls)
@@ -1487,8 +1531,8 @@ class AutoCADIntegration:
                 'groups_merged': exterior_perimeter['groups_merged'],
                 'bounds': exterior_perimeter['bounds']
             }
-            print(f"Building exterior perimeter: {len(exterior_perimeter['coordinates'])} points, "
-                  f"length {exterior_perimeter['total_length']:.1f}")
+            logger.info("Building exterior perimeter: %s points, length %.1f",
+                        len(exterior_perimeter['coordinates']), exterior_perimeter['total_length'])
         
         # Add room boundaries (limit to avoid chaos)
         max_rooms_to_show = 5  # Limit room boundaries to keep output clean
@@ -1501,8 +1545,8 @@ class AutoCADIntegration:
                 'groups_merged': room['groups_merged'],
                 'bounds': room['bounds']
             }
-            print(f"Room boundary {i+1}: {len(room['coordinates'])} points, "
-                  f"length {room['total_length']:.1f}")
+            logger.info("Room boundary %s: %s points, length %.1f",
+                        i+1, len(room['coordinates']), room['total_length'])
         
         # Add architectural features with unique identifiers
         feature_count = 0
@@ -1520,9 +1564,9 @@ class AutoCADIntegration:
                     'unique_id': unique_id,
                     'dimensions': feature['dimensions']
                 }
-                print(f"Detected {feature_type} {i+1}: {feature['dimensions']} (ID: {unique_id})")
+                logger.info("Detected %s %s: %s (ID: %s)", feature_type, i+1, feature['dimensions'], unique_id)
         
-        print(f"Created {len(boundary_groups)} organized architectural layers ({feature_count} features detected)")
+        logger.info("Created %s organized architectural layers (%s features detected)", len(boundary_groups), feature_count)
         return boundary_groups
     
     def _find_building_perimeter(self, classified_walls: List[Dict]) -> Optional[Dict]:
@@ -1659,10 +1703,15 @@ class AutoCADIntegration:
         if not classified_walls:
             return 'main_floor'  # Default
         
-        # Count different wall types
-        exterior_count = len([w for w in classified_walls if w['type'] == 'exterior'])
-        interior_count = len([w for w in classified_walls if w['type'] == 'interior'])
-        garage_count = len([w for w in classified_walls if w['type'] == 'garage_adjacent'])
+        # Count different wall types and gather layer name clues in one pass
+        type_counts = Counter()
+        all_layer_names = []
+        for wall in classified_walls:
+            type_counts[wall['type']] += 1
+            all_layer_names.extend(wall.get('layer_suggestions', []))
+        exterior_count = type_counts['exterior']
+        interior_count = type_counts['interior']
+        garage_count = type_counts['garage_adjacent']
         
         # Analyze building dimensions if exterior perimeter exists
         if exterior_perimeter:
@@ -1674,10 +1723,6 @@ class AutoCADIntegration:
                 return 'main_floor'
         
         # Analyze layer names for clues
-        all_layer_names = []
-        for wall in classified_walls:
-            all_layer_names.extend(wall.get('layer_suggestions', []))
-        
         layer_text = ' '.join(all_layer_names).lower()
         
         # Look for basement indicators
@@ -1706,14 +1751,14 @@ class AutoCADIntegration:
         Ensures boundaries are closed, non-self-intersecting loops suitable for professional CAD workflows
         """
         if not boundary or 'coordinates' not in boundary:
-            print(f"Rejected: {boundary_type} boundary missing coordinates")
+            logger.warning("Rejected: %s boundary missing coordinates", boundary_type)
             return None
             
         coords = boundary['coordinates']
         
         # STRICT: Reject boundaries with insufficient points
         if len(coords) < 3:
-            print(f"Rejected: {boundary_type} boundary has insufficient points ({len(coords)}) - minimum 3 required")
+            logger.warning("Rejected: %s boundary has insufficient points (%s) - minimum 3 required", boundary_type, len(coords))
             return None
         
         validated_coords = []
@@ -1725,7 +1770,7 @@ class AutoCADIntegration:
         
         # STRICT: After deduplication, must still have at least 3 points
         if len(validated_coords) < 3:
-            print(f"Rejected: {boundary_type} boundary has insufficient unique points after deduplication ({len(validated_coords)})")
+            logger.warning("Rejected: %s boundary has insufficient unique points after deduplication (%s)", boundary_type, len(validated_coords))
             return None
         
         # Ensure boundary is closed
@@ -1734,22 +1779,22 @@ class AutoCADIntegration:
         
         if self._distance_between_points(first_point, last_point) > 1.0:  # Not closed
             validated_coords.append(first_point)  # Close the boundary
-            print(f"Fixed: Closed {boundary_type} boundary by connecting endpoints")
+            logger.info("Fixed: Closed %s boundary by connecting endpoints", boundary_type)
         
         # STRICT: Check and reject self-intersections
         if self._has_obvious_self_intersection(validated_coords):
-            print(f"Rejected: {boundary_type} boundary has self-intersections - cannot be used for professional CAD workflows")
+            logger.warning("Rejected: %s boundary has self-intersections - cannot be used for professional CAD workflows", boundary_type)
             return None
         
         # STRICT: Final validation - ensure we have a valid polygon
         if len(validated_coords) < 4:  # Need at least 3 unique points + closure
-            print(f"Rejected: {boundary_type} boundary insufficient for closed polygon ({len(validated_coords)} points)")
+            logger.warning("Rejected: %s boundary insufficient for closed polygon (%s points)", boundary_type, len(validated_coords))
             return None
         
         # Calculate area to ensure polygon is valid
         area = self._calculate_polygon_area(validated_coords)
         if abs(area) < 10.0:  # Very small area might indicate degenerate polygon
-            print(f"Rejected: {boundary_type} boundary has very small area ({area:.2f}) - likely degenerate")
+            logger.warning("Rejected: %s boundary has very small area (%.2f) - likely degenerate", boundary_type, area)
             return None
         
         # Update boundary with validated coordinates
@@ -1767,7 +1812,7 @@ class AutoCADIntegration:
             'min_y': min(y_coords), 'max_y': max(y_coords)
         }
         
-        print(f"Validated: {boundary_type} boundary - {len(validated_coords)} points, area {abs(area):.1f}")
+        logger.info("Validated: %s boundary - %s points, area %.1f", boundary_type, len(validated_coords), abs(area))
         return validated_boundary
     
     def _calculate_polygon_area(self, coords: List[Tuple[float, float]]) -> float:
@@ -1818,7 +1863,7 @@ class AutoCADIntegration:
         suggested_layer = ai_classification.get('suggested_layer', '')
         
         if suggested_layer and suggested_layer.strip():
-            print(f"Using AI suggested layer name: {suggested_layer}")
+            logger.info("Using AI suggested layer name: %s", suggested_layer)
             return suggested_layer
         
         # Fall back to standard naming
@@ -1841,7 +1886,7 @@ class AutoCADIntegration:
 
     def _create_fallback_analysis(self) -> Dict:
         """Create a basic fallback analysis if no geometry is found"""
-        print("Creating fallback analysis with minimal structure")
+        logger.info("Creating fallback analysis with minimal structure")
         return {
             'drawing_type': 'floor_plan',
             'spaces': [{
@@ -1867,8 +1912,8 @@ def convert_pdf_to_image(pdf_path: str, output_path: Optional[str] = None) -> st
     if output_path is None:
         output_path = pdf_path.replace('.pdf', '.png')
     
-    print(f"PDF to image conversion would happen here: {pdf_path} -> {output_path}")
-    print("Note: For full implementation, install pdf2image library")
+    logger.info("PDF to image conversion would happen here: %s -> %s", pdf_path, output_path)
+    logger.warning("For full implementation, install pdf2image library")
     
     return output_path
 
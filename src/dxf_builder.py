@@ -1,7 +1,12 @@
 """
 DXFBuilder - Creates AutoCAD DXF files with original drawing + traced boundaries
 """
+import io
+import itertools
+import os
+import tempfile
 import ezdxf
+import numpy as np
 from ezdxf import colors
 from ezdxf.enums import TextEntityAlignment
 import logging
@@ -52,27 +57,23 @@ class DXFBuilder:
         # Calculate scale factor to fit in DXF space (target ~1000 units)
         scale = 1000.0 / max(page_width_pt, page_height_pt)
         
-        added_count = 0
         skipped_count = 0
         
+        # Gather every path's PDF points into one flat list (spans mark each path's
+        # slice), so they can be transformed in a single vectorized pass below
+        raw_points = []
+        spans = []
+        
         for path in vector_paths:
+            start = len(raw_points)
             try:
                 items = path.get("items", [])
                 if not items:
                     skipped_count += 1
                     continue
                 
-                # Get path properties
-                rect = path.get("rect")
-                fill = path.get("fill")
-                stroke = path.get("color")
-                width = path.get("width", 0.5)
-                
                 # Extract coordinates from path items
                 # PyMuPDF path items: 'l'=line, 'm'=move, 'c'=curve, 're'=rectangle, 'qu'=quad, etc.
-                points = []
-                current_pos = None
-                
                 for item in items:
                     item_type = item[0]
                     
@@ -81,11 +82,9 @@ class DXFBuilder:
                         if len(item) > 1:
                             point = item[1]
                             if hasattr(point, 'x') and hasattr(point, 'y'):
-                                current_pos = (point.x, point.y)
+                                raw_points.append((point.x, point.y))
                             elif isinstance(point, (tuple, list)) and len(point) >= 2:
-                                current_pos = (point[0], point[1])
-                            if current_pos:
-                                points.append(self._transform_point(current_pos, page_height_pt, scale))
+                                raw_points.append((point[0], point[1]))
                     
                     elif item_type == 'l':  # Line
                         # Line command: ('l', Point(x1, y1), Point(x2, y2))
@@ -93,31 +92,18 @@ class DXFBuilder:
                             # Extract start and end points
                             for point in [item[1], item[2]]:
                                 if hasattr(point, 'x') and hasattr(point, 'y'):
-                                    current_pos = (point.x, point.y)
-                                    points.append(self._transform_point(current_pos, page_height_pt, scale))
+                                    raw_points.append((point.x, point.y))
                                 elif isinstance(point, (tuple, list)) and len(point) >= 2:
-                                    current_pos = (point[0], point[1])
-                                    points.append(self._transform_point(current_pos, page_height_pt, scale))
+                                    raw_points.append((point[0], point[1]))
                     
-                    elif item_type == 'c':  # Curve (Bezier)
+                    elif item_type in ('c', 'qu'):  # Curve (Bezier) / quad bezier
                         # Curve command: ('c', Point1, Point2, Point3) - 3 control points
-                        for pt_item in item[1:]:
-                            if hasattr(pt_item, 'x') and hasattr(pt_item, 'y'):
-                                current_pos = (pt_item.x, pt_item.y)
-                                points.append(self._transform_point(current_pos, page_height_pt, scale))
-                            elif isinstance(pt_item, (tuple, list)) and len(pt_item) >= 2:
-                                current_pos = (pt_item[0], pt_item[1])
-                                points.append(self._transform_point(current_pos, page_height_pt, scale))
-                    
-                    elif item_type == 'qu':  # Quad bezier
                         # Quadratic bezier: ('qu', Point1, Point2)
                         for pt_item in item[1:]:
                             if hasattr(pt_item, 'x') and hasattr(pt_item, 'y'):
-                                current_pos = (pt_item.x, pt_item.y)
-                                points.append(self._transform_point(current_pos, page_height_pt, scale))
+                                raw_points.append((pt_item.x, pt_item.y))
                             elif isinstance(pt_item, (tuple, list)) and len(pt_item) >= 2:
-                                current_pos = (pt_item[0], pt_item[1])
-                                points.append(self._transform_point(current_pos, page_height_pt, scale))
+                                raw_points.append((pt_item[0], pt_item[1]))
                     
                     elif item_type == 're':  # Rectangle
                         # Rectangle: ('re', Rect) or ('re', (x, y, w, h))
@@ -131,34 +117,31 @@ class DXFBuilder:
                                 continue
                             
                             # Create rectangle points
-                            rect_points = [
-                                self._transform_point((x, y), page_height_pt, scale),
-                                self._transform_point((x + w, y), page_height_pt, scale),
-                                self._transform_point((x + w, y + h), page_height_pt, scale),
-                                self._transform_point((x, y + h), page_height_pt, scale),
-                                self._transform_point((x, y), page_height_pt, scale)
-                            ]
-                            points.extend(rect_points)
+                            raw_points.extend([
+                                (x, y), (x + w, y), (x + w, y + h), (x, y + h), (x, y)
+                            ])
                 
                 # Draw path if we have points
-                if len(points) >= 2:
-                    # Draw as polyline
-                    self.msp.add_lwpolyline(
-                        points,
-                        dxfattribs={
-                            'layer': 'ORIGINAL_DRAWING',
-                            'color': colors.WHITE
-                        }
-                    )
-                    added_count += 1
+                if len(raw_points) - start >= 2:
+                    spans.append((start, len(raw_points)))
                 else:
+                    del raw_points[start:]
                     skipped_count += 1
                     
             except Exception as e:
                 logger.debug(f"Skipped path due to error: {e}")
+                del raw_points[start:]
                 skipped_count += 1
                 continue
         
+        # One transform for the whole page; tolist() hands ezdxf plain floats
+        dxf_points = self.transform_points(raw_points, page_height_pt, scale).tolist() if raw_points else []
+        dxfattribs = {'layer': 'ORIGINAL_DRAWING', 'color': colors.WHITE}
+        for start, end in spans:
+            # Draw as polyline
+            self.msp.add_lwpolyline(dxf_points[start:end], dxfattribs=dxfattribs)
+        added_count = len(spans)
+        
         logger.info(f"Added {added_count} vector paths to ORIGINAL_DRAWING layer ({skipped_count} skipped)")
     
     def add_boundary(self, coordinates: list, floor_type: str, boundary_type: str):
@@ -166,11 +149,11 @@ class DXFBuilder:
         Add a traced boundary to the appropriate layer.
         
         Args:
-            coordinates: List of [x, y] pixel coordinates from AI
+            coordinates: [x, y] DXF coordinates, as a list of pairs or an (N, 2) array
             floor_type: Floor type (basement, main_floor, etc.)
             boundary_type: Type of boundary (exterior_outer, exterior_inner, interior_walls, garage_wall)
         """
-        if not coordinates or len(coordinates) < 3:
+        if coordinates is None or len(coordinates) < 3:
             logger.warning(f"Skipping {boundary_type} boundary - insufficient points")
             return
         
@@ -210,6 +193,31 @@ class DXFBuilder:
         
         logger.info(f"Added {boundary_type} boundary to layer '{custom_layer_name}' ({len(coordinates)} points, width={boundary_width} units)")
     
+    @staticmethod
+    def transform_points(points, page_height: float, scale: float) -> np.ndarray:
+        """
+        Vectorized _transform_point: PDF points (top-left origin) to DXF coordinates.
+        
+        Args:
+            points: (x, y) pairs in PDF points, as a sequence or an (N, 2) array
+            page_height: Page height in points
+            scale: Scale factor
+            
+        Returns:
+            (N, 2) float64 array in DXF coordinates
+        """
+        if isinstance(points, np.ndarray):
+            pts = points.astype(np.float64, copy=False).reshape(-1, 2)
+        else:
+            # fromiter over the flattened pairs is ~2.5x faster than np.asarray on tuples
+            pts = np.fromiter(itertools.chain.from_iterable(points), dtype=np.float64,
+                              count=2 * len(points)).reshape(-1, 2)
+        out = np.empty_like(pts)
+        np.multiply(pts[:, 0], scale, out=out[:, 0])
+        np.subtract(page_height, pts[:, 1], out=out[:, 1])
+        out[:, 1] *= scale
+        return out
+    
     def _transform_point(self, point: tuple, page_height: float, scale: float) -> tuple:
         """
         Transform PDF coordinates to DXF coordinates.
@@ -232,11 +240,48 @@ class DXFBuilder:
         return (dxf_x, dxf_y)
     
     def save(self):
-        """Save the DXF file"""
+        """
+        Save the DXF file. The document is serialized in memory and written with a
+        single write to a temp file that is renamed into place, so a concurrent
+        download never sees a half-written file.
+        """
         try:
-            self.doc.saveas(self.output_path)
+            buffer = self.write(io.BytesIO()).getbuffer()
+            directory = os.path.dirname(os.path.abspath(self.output_path))
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(buffer)
+                os.chmod(tmp_path, 0o644)  # mkstemp creates 0600; keep outputs readable like saveas did
+                os.replace(tmp_path, self.output_path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
             logger.info(f"DXF file saved successfully: {self.output_path}")
             return self.output_path
         except Exception as e:
             logger.error(f"Failed to save DXF: {e}")
             raise Exception(f"Failed to save DXF file: {str(e)}")
+    
+    def write(self, stream):
+        """
+        Write the DXF to a binary stream (e.g. io.BytesIO) instead of the file system.
+        Uses the same encoding as save().
+        
+        Args:
+            stream: Writable binary file-like object
+            
+        Returns:
+            The stream, for chaining
+        """
+        try:
+            text = io.TextIOWrapper(stream, encoding=self.doc.output_encoding,
+                                    errors='dxfreplace', write_through=True)
+            self.doc.write(text)
+            text.flush()
+            text.detach()  # leave the caller's stream open
+            logger.info("DXF written to stream")
+            return stream
+        except Exception as e:
+            logger.error(f"Failed to write DXF: {e}")
+            raise Exception(f"Failed to write DXF: {str(e)}")
@@ -1,5 +1,7 @@
+import csv
 import math
 import json
+import re
 from typing import Dict, List, Tuple, Optional, Any, TYPE_CHECKING
 from collections import defaultdict, Counter
 import ezdxf
@@ -7,6 +9,11 @@ import ezdxf
 if TYPE_CHECKING:
     from .autocad_integration import AutoCADIntegration
 
+# Layer-name keywords, compiled once so each wall group needs a single scan
+BASEMENT_LAYER_RE = re.compile('basement|bsmt')
+UPPER_FLOOR_LAYER_RE = re.compile('second|2nd|upper')
+GARAGE_LAYER_RE = re.compile('garage|gar|carport')
+
 class EnhancedGeometryProcessor:
     """
     Comprehensive DXF geometry processor that provides:
@@ -106,8 +113,9 @@ class EnhancedGeometryProcessor:
         measurements = self._extract_measurements(entities, elements_detected, wall_classification)
         
         # Step 6: Enhance with AI analysis if available
+        ai_enhanced = False
         if ai_analyzer:
-            house_structure, wall_classification, elements_detected = self._enhance_with_ai(
+            house_structure, wall_classification, elements_detected, ai_enhanced = self._enhance_with_ai(
                 ai_analyzer, house_structure, wall_classification, elements_detected, entities
             )
         
@@ -119,7 +127,7 @@ class EnhancedGeometryProcessor:
         # Step 8: Prepare results in expected format
         return self._format_results(
             house_structure, wall_classification, elements_detected, 
-            measurements, drawing_commands
+            measurements, drawing_commands, ai_enhanced
         )
     
     def _detect_house_outline(self, entities: Dict[str, List]) -> Dict:
@@ -436,9 +444,9 @@ class EnhancedGeometryProcessor:
         # Check layer names for clues
         layer_names = ' '.join(wall_group['layers']).lower()
         
-        if 'basement' in layer_names or 'bsmt' in layer_names:
+        if BASEMENT_LAYER_RE.search(layer_names):
             return 'basement'
-        elif 'second' in layer_names or '2nd' in layer_names or 'upper' in layer_names:
+        elif UPPER_FLOOR_LAYER_RE.search(layer_names):
             return 'second_floor'
         else:
             return 'main_floor'
@@ -449,9 +457,8 @@ class EnhancedGeometryProcessor:
         """
         # Check layer names for garage indicators
         layer_names = ' '.join(wall_group['layers']).lower()
-        garage_keywords = ['garage', 'gar', 'carport']
         
-        return any(keyword in layer_names for keyword in garage_keywords)
+        return GARAGE_LAYER_RE.search(layer_names) is not None
     
     def _detect_architectural_elements(self, entities: Dict, house_structure: Dict) -> Dict:
         """
@@ -465,11 +472,14 @@ class EnhancedGeometryProcessor:
             'openings': []
         }
         
+        # Classify closed rectangles as door- or window-sized in a single pass
+        door_rects, window_rects = self._detect_rectangular_openings(entities, house_structure)
+        
         # Detect doors from blocks or specific geometry patterns
-        elements['doors'] = self._detect_doors(entities, house_structure)
+        elements['doors'] = self._detect_doors(entities, house_structure, door_rects)
         
         # Detect windows from blocks or geometry patterns
-        elements['windows'] = self._detect_windows(entities, house_structure)
+        elements['windows'] = self._detect_windows(entities, house_structure, window_rects)
         
         # Detect openings in walls (potential doors/windows)
         elements['openings'] = self._detect_wall_openings(entities, house_structure)
@@ -481,9 +491,11 @@ class EnhancedGeometryProcessor:
         
         return elements
     
-    def _detect_doors(self, entities: Dict, house_structure: Dict) -> List[Dict]:
+    def _detect_doors(self, entities: Dict, house_structure: Dict,
+                      door_rects: Optional[List[Dict]] = None) -> List[Dict]:
         """
-        Detect door elements from DXF geometry
+        Detect door elements from DXF geometry.
+        door_rects: rectangular doors already found by _detect_rectangular_openings
         """
         doors = []
         
@@ -499,13 +511,17 @@ class EnhancedGeometryProcessor:
         doors.extend(self._detect_door_arcs(entities, house_structure))
         
         # Look for rectangular openings that might be doors
-        doors.extend(self._detect_door_rectangles(entities, house_structure))
+        if door_rects is None:
+            door_rects, _ = self._detect_rectangular_openings(entities, house_structure)
+        doors.extend(door_rects)
         
         return doors
     
-    def _detect_windows(self, entities: Dict, house_structure: Dict) -> List[Dict]:
+    def _detect_windows(self, entities: Dict, house_structure: Dict,
+                        window_rects: Optional[List[Dict]] = None) -> List[Dict]:
         """
-        Detect window elements from DXF geometry
+        Detect window elements from DXF geometry.
+        window_rects: rectangular windows already found by _detect_rectangular_openings
         """
         windows = []
         
@@ -518,7 +534,9 @@ class EnhancedGeometryProcessor:
                     windows.append(window)
         
         # Look for small rectangular patterns that might be windows
-        windows.extend(self._detect_window_rectangles(entities, house_structure))
+        if window_rects is None:
+            _, window_rects = self._detect_rectangular_openings(entities, house_structure)
+        windows.extend(window_rects)
         
         return windows
     
@@ -552,64 +570,57 @@ class EnhancedGeometryProcessor:
         
         return doors
     
-    def _detect_door_rectangles(self, entities: Dict, house_structure: Dict) -> List[Dict]:
-        """
-        Detect doors from rectangular openings
+    def _detect_rectangular_openings(self, entities: Dict,
+                                     house_structure: Dict) -> Tuple[List[Dict], List[Dict]]:
         """
-        doors = []
+        Detect doors and windows from closed rectangular polylines.
+        Each polyline's bounds are computed once and it is classified as a door
+        (standard door size) or else a window (window size range), or neither.
         
-        # Analyze closed polylines that might represent doors
-        for polyline in entities.get('lwpolylines', []):
-            if polyline.get('closed', False):
-                bounds = self._calculate_polyline_bounds(polyline['points'])
-                width = bounds['max_x'] - bounds['min_x']
-                height = bounds['max_y'] - bounds['min_y']
-                
-                # Check if dimensions match typical door sizes
-                if self._is_door_sized(width, height):
-                    door = {
-                        'type': 'rectangular_door',
-                        'bounds': bounds,
-                        'width': width,
-                        'height': height,
-                        'center': ((bounds['min_x'] + bounds['max_x'])/2, (bounds['min_y'] + bounds['max_y'])/2),
-                        'layer_name': self._determine_door_layer_name((bounds['min_x'] + bounds['max_x'])/2, house_structure),
-                        'color': self.layer_colors.get(self._determine_door_layer_name((bounds['min_x'] + bounds['max_x'])/2, house_structure), 6),
-                        'confidence': 0.6,
-                        'source': 'rectangle_pattern'
-                    }
-                    doors.append(door)
-        
-        return doors
-    
-    def _detect_window_rectangles(self, entities: Dict, house_structure: Dict) -> List[Dict]:
-        """
-        Detect windows from rectangular patterns
+        Returns:
+            (doors, windows)
         """
+        doors = []
         windows = []
         
         for polyline in entities.get('lwpolylines', []):
-            if polyline.get('closed', False):
-                bounds = self._calculate_polyline_bounds(polyline['points'])
-                width = bounds['max_x'] - bounds['min_x']
-                height = bounds['max_y'] - bounds['min_y']
-                
-                # Check if dimensions match typical window sizes
-                if self._is_window_sized(width, height):
-                    window = {
-                        'type': 'rectangular_window',
-                        'bounds': bounds,
-                        'width': width,
-                        'height': height,
-                        'center': ((bounds['min_x'] + bounds['max_x'])/2, (bounds['min_y'] + bounds['max_y'])/2),
-                        'layer_name': self._determine_window_layer_name((bounds['min_x'] + bounds['max_x'])/2, house_structure),
-                        'color': self.layer_colors.get(self._determine_window_layer_name((bounds['min_x'] + bounds['max_x'])/2, house_structure), 7),
-                        'confidence': 0.6,
-                        'source': 'rectangle_pattern'
-                    }
-                    windows.append(window)
+            if not polyline.get('closed', False):
+                continue
+            
+            bounds = self._calculate_polyline_bounds(polyline['points'])
+            width = bounds['max_x'] - bounds['min_x']
+            height = bounds['max_y'] - bounds['min_y']
+            center = ((bounds['min_x'] + bounds['max_x'])/2, (bounds['min_y'] + bounds['max_y'])/2)
+            
+            # Check if dimensions match typical door sizes, then window sizes
+            if self._is_door_sized(width, height):
+                layer_name = self._determine_door_layer_name(center[0], house_structure)
+                doors.append({
+                    'type': 'rectangular_door',
+                    'bounds': bounds,
+                    'width': width,
+                    'height': height,
+                    'center': center,
+                    'layer_name': layer_name,
+                    'color': self.layer_colors.get(layer_name, 6),
+                    'confidence': 0.6,
+                    'source': 'rectangle_pattern'
+                })
+            elif self._is_window_sized(width, height, is_door_sized=False):
+                layer_name = self._determine_window_layer_name(center[0], house_structure)
+                windows.append({
+                    'type': 'rectangular_window',
+                    'bounds': bounds,
+                    'width': width,
+                    'height': height,
+                    'center': center,
+                    'layer_name': layer_name,
+                    'color': self.layer_colors.get(layer_name, 7),
+                    'confidence': 0.6,
+                    'source': 'rectangle_pattern'
+                })
         
-        return windows
+        return doors, windows
     
     def _is_door_sized(self, width: float, height: float) -> bool:
         """Check if dimensions match typical door sizes"""
@@ -628,23 +639,26 @@ class EnhancedGeometryProcessor:
         
         return False
     
-    def _is_window_sized(self, width: float, height: float) -> bool:
-        """Check if dimensions match typical window sizes"""
+    def _is_window_sized(self, width: float, height: float,
+                         is_door_sized: Optional[bool] = None) -> bool:
+        """Check if dimensions match typical window sizes (pass is_door_sized if already known)"""
         # Basic window size check - windows are typically smaller than doors
         # and have different aspect ratios
-        return (12 <= width <= 96 and 12 <= height <= 72 and 
-                not self._is_door_sized(width, height))
+        if is_door_sized is None:
+            is_door_sized = self._is_door_sized(width, height)
+        return 12 <= width <= 96 and 12 <= height <= 72 and not is_door_sized
     
     def _calculate_polyline_bounds(self, points: List[Tuple[float, float]]) -> Dict:
         """Calculate bounds for a polyline"""
         if not points:
             return {'min_x': 0, 'max_x': 0, 'min_y': 0, 'max_y': 0}
         
+        xs, ys = zip(*((p[0], p[1]) for p in points))
         return {
-            'min_x': min(p[0] for p in points),
-            'max_x': max(p[0] for p in points),
-            'min_y': min(p[1] for p in points),
-            'max_y': max(p[1] for p in points)
+            'min_x': min(xs),
+            'max_x': max(xs),
+            'min_y': min(ys),
+            'max_y': max(ys)
         }
     
     def _find_nearby_wall_segments(self, center: Tuple[float, float], house_structure: Dict, radius: float) -> List[Dict]:
@@ -743,29 +757,11 @@ class EnhancedGeometryProcessor:
             if classification['is_exterior']:
                 measurements['perimeter_length'] += classification['total_length']
         
-        # Extract door measurements
-        for door in elements.get('doors', []):
-            door_measurement = {
-                'type': door['type'],
-                'layer_name': door['layer_name'],
-                'width': door.get('width', 0),
-                'height': door.get('height', 0),
-                'position': door.get('center', door.get('position', (0, 0))),
-                'area': door.get('width', 0) * door.get('height', 0) if door.get('width') and door.get('height') else 0
-            }
-            measurements['doors'].append(door_measurement)
-        
-        # Extract window measurements
-        for window in elements.get('windows', []):
-            window_measurement = {
-                'type': window['type'],
-                'layer_name': window['layer_name'],
-                'width': window.get('width', 0),
-                'height': window.get('height', 0),
-                'position': window.get('center', window.get('position', (0, 0))),
-                'area': window.get('width', 0) * window.get('height', 0) if window.get('width') and window.get('height') else 0
-            }
-            measurements['windows'].append(window_measurement)
+        # Extract door and window measurements
+        for element_type in ('doors', 'windows'):
+            measurements[element_type] = [
+                self._measure_element(element) for element in elements.get(element_type, ())
+            ]
         
         # Calculate total building area (simplified)
         # This would be enhanced to calculate actual room areas
@@ -778,10 +774,25 @@ class EnhancedGeometryProcessor:
         
         return measurements
     
+    def _measure_element(self, element: Dict) -> Dict:
+        """Measurement record for a door or window (each field looked up once)"""
+        width = element.get('width', 0)
+        height = element.get('height', 0)
+        return {
+            'type': element['type'],
+            'layer_name': element['layer_name'],
+            'width': width,
+            'height': height,
+            'position': element.get('center', element.get('position', (0, 0))),
+            'area': width * height if width and height else 0
+        }
+    
     def _enhance_with_ai(self, ai_analyzer, house_structure: Dict, wall_classification: Dict, 
-                        elements: Dict, entities: Dict) -> Tuple[Dict, Dict, Dict]:
+                        elements: Dict, entities: Dict) -> Tuple[Dict, Dict, Dict, bool]:
         """
-        Enhance the analysis with AI insights
+        Enhance the analysis with AI insights.
+        The last returned value is False when the AI call failed and the
+        geometric analysis was returned unchanged.
         """
         print("Enhancing analysis with AI...")
         
@@ -823,8 +834,9 @@ class EnhancedGeometryProcessor:
             
         except Exception as e:
             print(f"AI enhancement failed: {e}. Continuing with geometric analysis.")
+            return house_structure, wall_classification, elements, False
         
-        return house_structure, wall_classification, elements
+        return house_structure, wall_classification, elements, True
     
     def _segments_to_polylines(self, segments: List[Dict]) -> List[List[Tuple[float, float]]]:
         """
@@ -1024,7 +1036,8 @@ class EnhancedGeometryProcessor:
         return commands
     
     def _format_results(self, house_structure: Dict, wall_classification: Dict, 
-                       elements: Dict, measurements: Dict, drawing_commands: List[Dict]) -> Dict:
+                       elements: Dict, measurements: Dict, drawing_commands: List[Dict],
+                       ai_enhanced: bool = False) -> Dict:
         """
         Format the results in the expected output format
         """
@@ -1033,9 +1046,9 @@ class EnhancedGeometryProcessor:
                          len(elements.get('windows', [])) + 
                          len(elements.get('openings', [])))
         
-        # Extract layer names for reporting
-        layers_created = list(set(
-            [cmd['layer_name'] for cmd in drawing_commands if cmd['action'] == 'create_layer']
+        # Extract layer names for reporting (single pass, first-seen order)
+        layers_created = list(dict.fromkeys(
+            cmd['layer_name'] for cmd in drawing_commands if cmd['action'] == 'create_layer'
         ))
         
         return {
@@ -1076,7 +1089,8 @@ class EnhancedGeometryProcessor:
                 'total_wall_groups': len(wall_classification.get('classifications', [])),
                 'perimeter_length': measurements.get('perimeter_length', 0),
                 'total_area': measurements.get('total_area', 0),
-                'processing_method': 'enhanced_dxf_geometry'
+                'processing_method': 'enhanced_dxf_geometry',
+                'ai_enhanced': ai_enhanced
             }
         }
     
@@ -1111,8 +1125,6 @@ class EnhancedGeometryProcessor:
         Export measurements to CSV format
         """
         try:
-            import csv
-            
             with open(output_path, 'w', newline='') as csvfile:
                 writer = csv.writer(csvfile)
                 
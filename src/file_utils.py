@@ -0,0 +1,75 @@
+"""
+File utilities - Streaming and housekeeping helpers for uploaded and generated files
+"""
+import contextlib
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+from typing import Iterable
+
+logger = logging.getLogger(__name__)
+
+COPY_CHUNK_SIZE = 1 << 20  # 1 MiB
+
+
+def stream_to_file(stream, file_path: str, chunk_size: int = COPY_CHUNK_SIZE) -> str:
+    """
+    Copy a readable binary stream (e.g. an upload's FileStorage.stream) to disk
+    in fixed-size chunks, so memory use stays constant regardless of file size.
+    The content is hashed in the same pass.
+
+    Args:
+        stream: Binary file-like object to read from
+        file_path: Destination path (overwritten)
+        chunk_size: Read size in bytes (default 1 MiB)
+
+    Returns:
+        SHA-256 hex digest of the written content (same as analysis_cache.hash_file)
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'wb') as f:
+        while chunk := stream.read(chunk_size):
+            digest.update(chunk)
+            f.write(chunk)
+    return digest.hexdigest()
+
+
+def cleanup_files(paths: Iterable[str], keep: Iterable[str] = ()) -> int:
+    """
+    Delete files, ignoring ones that are already gone or cannot be removed.
+    Only OSError is suppressed, so interrupts and programming errors propagate.
+
+    Args:
+        paths: Files to delete
+        keep: Paths to leave in place (e.g. an output that should survive)
+
+    Returns:
+        Number of files deleted
+    """
+    keep = set(keep)
+    removed = 0
+    for path in paths:
+        if path in keep:
+            continue
+        with contextlib.suppress(OSError):
+            os.unlink(path)
+            removed += 1
+    return removed
+
+
+def make_work_dir(parent: str) -> str:
+    """
+    Create a private, uniquely named directory under parent for one request's
+    files, so concurrent requests with the same upload name never collide.
+    Remove it with remove_work_dir when the request is done.
+    """
+    os.makedirs(parent, exist_ok=True)
+    return tempfile.mkdtemp(dir=parent)
+
+
+def remove_work_dir(path: str):
+    """Delete a directory created by make_work_dir and everything in it, ignoring errors"""
+    shutil.rmtree(path, ignore_errors=True)
+
@@ -6,6 +6,7 @@ import os
 import base64
 import json
 import logging
+import threading
 from io import BytesIO
 from PIL import Image
 from openai import OpenAI
@@ -253,3 +254,21 @@ Return ONLY the JSON object, no additional text or explanations."""
         
         logger.debug(f"Boundary '{name}': {len(cleaned)} points")
         return cleaned
+
+
+_analyzer = None
+_analyzer_lock = threading.Lock()
+
+
+def get_floor_plan_analyzer() -> FloorPlanAnalyzer:
+    """
+    Return the process-wide FloorPlanAnalyzer, creating it on first use.
+    Sharing it keeps one OpenAI client (and its pooled HTTPS connections)
+    per process instead of one per request; the analyzer has no per-drawing state.
+    """
+    global _analyzer
+    if _analyzer is None:
+        with _analyzer_lock:
+            if _analyzer is None:
+                _analyzer = FloorPlanAnalyzer()
+    return _analyzer
@@ -0,0 +1,124 @@
+"""
+JobQueue - Background execution of long-running processing pipelines
+Lets request handlers return a job id immediately while the work runs in a process pool
+"""
+import logging
+import multiprocessing
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(RuntimeError):
+    """Raised by JobQueue.submit when max_pending jobs are already queued or running"""
+
+
+class JobQueue:
+    """Runs jobs in a process pool and tracks their status by job id"""
+
+    def __init__(self, max_workers: Optional[int] = None, max_history: int = 1000,
+                 max_pending: Optional[int] = None, start_method: str = 'spawn'):
+        """
+        Args:
+            max_workers: Worker process count (default: CPU count)
+            max_history: Finished jobs kept for status/result lookups before the oldest are dropped
+            max_pending: Jobs allowed to be queued or running at once; further submits
+                         raise QueueFull instead of piling up (default: unbounded)
+            start_method: multiprocessing start method for the workers. The pool starts
+                          them lazily from a request thread, so the default 'spawn' avoids
+                          forking a multi-threaded server process
+        """
+        self.executor = ProcessPoolExecutor(max_workers=max_workers,
+                                            mp_context=multiprocessing.get_context(start_method))
+        self.max_history = max_history
+        self._slots = threading.BoundedSemaphore(max_pending) if max_pending else None
+        self._jobs: 'OrderedDict[str, Future]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, fn: Callable, *args, **kwargs) -> str:
+        """
+        Queue fn(*args, **kwargs) for background execution.
+        fn and its arguments must be picklable (module-level function, plain data).
+
+        Returns:
+            Job id
+            
+        Raises:
+            QueueFull: max_pending jobs are already in flight
+        """
+        if self._slots is not None and not self._slots.acquire(blocking=False):
+            raise QueueFull("Too many jobs in progress")
+        
+        job_id = uuid.uuid4().hex
+        try:
+            future = self.executor.submit(fn, *args, **kwargs)
+        except Exception:
+            self._release_slot()
+            raise
+        future.add_done_callback(lambda f: self._log_done(job_id, f))
+        future.add_done_callback(lambda f: self._release_slot())
+
+        with self._lock:
+            self._jobs[job_id] = future
+            self._prune()
+
+        logger.info(f"Queued job {job_id}")
+        return job_id
+
+    def status(self, job_id: str) -> Optional[str]:
+        """Return 'queued', 'running', 'finished' or 'failed', or None for an unknown job"""
+        future = self._get(job_id)
+        if future is None:
+            return None
+        if not future.done():
+            return 'running' if future.running() else 'queued'
+        if future.cancelled() or future.exception() is not None:
+            return 'failed'
+        return 'finished'
+
+    def result(self, job_id: str):
+        """
+        Return the job's result.
+
+        Raises:
+            KeyError: Unknown job id
+            RuntimeError: Job has not finished yet
+            Exception: Whatever the job raised
+        """
+        future = self._get(job_id)
+        if future is None:
+            raise KeyError(job_id)
+        if not future.done():
+            raise RuntimeError(f"Job {job_id} has not finished")
+        return future.result()
+
+    def shutdown(self, wait: bool = True):
+        """Stop accepting jobs and release the worker processes"""
+        self.executor.shutdown(wait=wait)
+
+    def _release_slot(self):
+        if self._slots is not None:
+            self._slots.release()
+    
+    def _get(self, job_id: str) -> Optional[Future]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _prune(self):
+        # Caller holds _lock; drop the oldest finished jobs beyond max_history
+        excess = len(self._jobs) - self.max_history
+        for job_id in [job_id for job_id, f in self._jobs.items() if f.done()][:max(0, excess)]:
+            del self._jobs[job_id]
+
+    @staticmethod
+    def _log_done(job_id: str, future: Future):
+        if future.cancelled():
+            logger.warning(f"Job {job_id} cancelled")
+        elif future.exception() is not None:
+            logger.error(f"Job {job_id} failed: {future.exception()}")
+        else:
+            logger.info(f"Job {job_id} finished")
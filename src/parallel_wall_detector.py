@@ -273,40 +273,26 @@ class ParallelWallDetector:
         if len(boundary) < 3:
             return []
         
-        offset_points = []
+        # Work on all vertices at once. Row i of edges is the edge into point i; rolled
+        # by one it is the edge out of point i (wrapping around the boundary)
+        points = np.asarray(boundary, dtype=np.float64)
+        edges = points - np.roll(points, 1, axis=0)
         
-        for i in range(len(boundary)):
-            # Get three consecutive points (with wrapping)
-            p_prev = boundary[(i - 1) % len(boundary)]
-            p_curr = boundary[i]
-            p_next = boundary[(i + 1) % len(boundary)]
-            
-            # Calculate inward normal at current point
-            # Average the normals of the two adjacent segments
-            dx1 = p_curr[0] - p_prev[0]
-            dy1 = p_curr[1] - p_prev[1]
-            len1 = np.sqrt(dx1**2 + dy1**2) or 1.0
-            
-            dx2 = p_next[0] - p_curr[0]
-            dy2 = p_next[1] - p_curr[1]
-            len2 = np.sqrt(dx2**2 + dy2**2) or 1.0
-            
-            # Perpendicular vectors (inward)
-            norm1_x = -dy1 / len1
-            norm1_y = dx1 / len1
-            
-            norm2_x = -dy2 / len2
-            norm2_y = dx2 / len2
-            
-            # Average normal
-            avg_norm_x = (norm1_x + norm2_x) / 2
-            avg_norm_y = (norm1_y + norm2_y) / 2
-            avg_len = np.sqrt(avg_norm_x**2 + avg_norm_y**2) or 1.0
-            
-            # Offset point inward
-            offset_x = p_curr[0] + (avg_norm_x / avg_len) * offset
-            offset_y = p_curr[1] + (avg_norm_y / avg_len) * offset
-            
-            offset_points.append((offset_x, offset_y))
+        # Unit edge vectors, normalized in place (zero-length edges count as length 1)
+        lengths = np.hypot(edges[:, 0], edges[:, 1])
+        lengths[lengths == 0] = 1.0
+        edges /= lengths[:, None]
+        
+        # Perpendicular vectors (inward), averaged: the sum of the incoming and
+        # outgoing unit edges, rotated
+        direction = edges + np.roll(edges, -1, axis=0)
+        avg_norm = np.empty_like(points)
+        np.negative(direction[:, 1], out=avg_norm[:, 0])
+        avg_norm[:, 1] = direction[:, 0]
+        avg_len = np.hypot(avg_norm[:, 0], avg_norm[:, 1])
+        avg_len[avg_len == 0] = 1.0
         
-        return offset_points
+        # Offset points inward (scaled and shifted in place)
+        avg_norm *= (offset / avg_len)[:, None]
+        offset_points = np.add(avg_norm, points, out=avg_norm)
+        return [tuple(p) for p in offset_points.tolist()]
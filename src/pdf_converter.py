@@ -1,9 +1,20 @@
 import os
+import logging
 import fitz  # PyMuPDF
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 from PIL import Image, ImageEnhance
 import cv2
 import numpy as np
+from .file_utils import cleanup_files
+
+logger = logging.getLogger(__name__)
+
+# Rendered pages are short-lived intermediates: favour encode speed over size.
+# OpenCV's default zlib level 1 + RLE is already the fastest setting measured on
+# 300 DPI sheets (an explicit IMWRITE_PNG_COMPRESSION switches to the slower
+# default strategy), so pin that strategy rather than a compression level.
+PNG_WRITE_PARAMS = [cv2.IMWRITE_PNG_STRATEGY, cv2.IMWRITE_PNG_STRATEGY_RLE]
+
 
 class PDFConverter:
     """Convert PDF architectural drawings to high-quality images for AI analysis"""
@@ -20,16 +31,18 @@ class PDFConverter:
         self.min_dpi = 150  # Minimum acceptable DPI
         self.optimal_dpi = 300  # Optimal DPI for analysis
     
-    def convert_to_images(self, pdf_path: str, output_dir: str = None) -> List[str]:
+    def convert_to_images(self, pdf_path: str, output_dir: str = None,
+                          pages: Optional[List[int]] = None) -> List[str]:
         """
         Convert PDF pages to high-resolution PNG images with preprocessing
         
         Args:
             pdf_path: Path to PDF file
             output_dir: Directory to save images (default: same as PDF)
+            pages: 1-based page numbers to convert (default: all pages)
             
         Returns:
-            List of paths to generated image files
+            List of paths to generated image files, in the order of pages
         """
         if output_dir is None:
             output_dir = os.path.dirname(pdf_path)
@@ -37,54 +50,64 @@ class PDFConverter:
         # Ensure output directory exists
         os.makedirs(output_dir, exist_ok=True)
         
-        image_paths = []
-        
         try:
-            # Open PDF document
-            doc = fitz.open(pdf_path)
-            
-            # Detect if PDF is vector or scanned
-            is_vector = self._is_vector_pdf(doc)
-            print(f"PDF type: {'Vector' if is_vector else 'Scanned/Raster'}")
-            
-            # Adjust DPI if needed for better quality
-            effective_dpi = self._get_effective_dpi(doc, is_vector)
-            effective_zoom = effective_dpi / 72.0
-            
-            print(f"Converting PDF with {len(doc)} page(s) at {effective_dpi} DPI...")
-            
-            # Process each page
-            for page_num in range(len(doc)):
-                page = doc.load_page(page_num)
+            # Open PDF document; closed even if rendering a page fails
+            with fitz.open(pdf_path) as doc:
+                # Detect if PDF is vector or scanned
+                is_vector = self._is_vector_pdf(doc)
+                logger.info("PDF type: %s", 'Vector' if is_vector else 'Scanned/Raster')
                 
-                # Create transformation matrix for high DPI
-                mat = fitz.Matrix(effective_zoom, effective_zoom)
+                # Adjust DPI if needed for better quality
+                effective_dpi = self._get_effective_dpi(doc, is_vector)
+                effective_zoom = effective_dpi / 72.0
                 
-                # Render page to pixmap
-                pix = page.get_pixmap(matrix=mat, alpha=False)
-                
-                # Generate output filename
-                base_name = os.path.splitext(os.path.basename(pdf_path))[0]
-                output_path = os.path.join(output_dir, f"{base_name}_page_{page_num + 1}.png")
+                if pages is None:
+                    page_indices = range(len(doc))
+                else:
+                    invalid = [p for p in pages if not 1 <= p <= len(doc)]
+                    if invalid:
+                        raise ValueError(f"Page(s) {invalid} out of range. PDF has {len(doc)} pages")
+                    page_indices = [p - 1 for p in pages]
                 
-                # Save as PNG
-                pix.save(output_path)
+                logger.info("Converting %s of %s page(s) at %s DPI...", len(page_indices), len(doc), effective_dpi)
                 
-                print(f"  Converted page {page_num + 1}: {pix.width}x{pix.height} pixels -> {output_path}")
-                
-                # Validate and preprocess image for better wall detection
-                preprocessed_path = self._preprocess_image(output_path, is_vector)
-                image_paths.append(preprocessed_path)
-            
-            doc.close()
+                base_name = os.path.splitext(os.path.basename(pdf_path))[0]
+                image_paths = []
+                try:
+                    # Process each requested page
+                    for page_num in page_indices:
+                        output_path = os.path.join(output_dir, f"{base_name}_page_{page_num + 1}.png")
+                        image_paths.append(output_path)
+                        self._render_page(doc, page_num, effective_zoom, output_path, is_vector)
+                except Exception:
+                    # Don't leave the pages rendered before the failure behind
+                    cleanup_files(image_paths)
+                    raise
             
-            print(f"Successfully converted and preprocessed {len(image_paths)} page(s) from PDF")
+            logger.info("Successfully converted and preprocessed %s page(s) from PDF", len(image_paths))
             return image_paths
             
         except Exception as e:
-            print(f"Error converting PDF to images: {e}")
+            logger.error("Error converting PDF to images: %s", e)
             raise Exception(f"PDF conversion failed: {str(e)}")
     
+    def _render_page(self, doc, page_num: int, zoom: float, output_path: str,
+                     is_vector: bool) -> str:
+        """Render, preprocess and save one page; returns the image path"""
+        page = doc.load_page(page_num)
+        
+        # Render page to pixmap at the target resolution
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+        
+        logger.info("  Converted page %s: %sx%s pixels -> %s", page_num + 1, pix.width, pix.height, output_path)
+        
+        # Validate and preprocess in memory, then encode the PNG once
+        img = self._pixmap_to_bgr(pix)
+        processed = self._preprocess_image(img, is_vector)
+        if not cv2.imwrite(output_path, processed, PNG_WRITE_PARAMS):
+            raise IOError(f"Could not write image: {output_path}")
+        return output_path
+    
     def _is_vector_pdf(self, doc) -> bool:
         """Detect if PDF contains vector graphics or is a scanned image"""
         try:
@@ -110,7 +133,7 @@ class PDFConverter:
             return len(drawings) > 0
             
         except Exception as e:
-            print(f"Warning: Could not detect PDF type: {e}")
+            logger.warning("Could not detect PDF type: %s", e)
             return True  # Default to vector
     
     def _get_effective_dpi(self, doc, is_vector: bool) -> int:
@@ -122,28 +145,27 @@ class PDFConverter:
             # For scanned PDFs, use requested DPI but ensure minimum quality
             return max(self.dpi, self.min_dpi)
     
-    def _preprocess_image(self, image_path: str, is_vector: bool) -> str:
+    def _pixmap_to_bgr(self, pix) -> np.ndarray:
+        """Wrap a PyMuPDF RGB pixmap as an OpenCV BGR array without a PNG round-trip"""
+        rgb = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+        return cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+    
+    def _preprocess_image(self, img: np.ndarray, is_vector: bool) -> np.ndarray:
         """
         Preprocess image to enhance wall visibility for AI analysis
         
         Args:
-            image_path: Path to image file
+            img: BGR image array
             is_vector: Whether the source PDF was vector
             
         Returns:
-            Path to preprocessed image (same as input, modified in place)
+            Preprocessed BGR image array (the input array if preprocessing fails)
         """
         try:
-            # Load image
-            img = cv2.imread(image_path)
-            if img is None:
-                print(f"Warning: Could not load image for preprocessing: {image_path}")
-                return image_path
-            
             # Validate image quality
             quality_ok, quality_msg = self._validate_image_quality(img)
             if not quality_ok:
-                print(f"Warning: Image quality issue: {quality_msg}")
+                logger.warning("Image quality issue: %s", quality_msg)
             
             # Apply preprocessing based on PDF type
             if is_vector:
@@ -153,15 +175,13 @@ class PDFConverter:
                 # For scanned PDFs, apply enhancement
                 processed = self._enhance_scanned_image(img)
             
-            # Save preprocessed image
-            cv2.imwrite(image_path, processed)
-            print(f"  Preprocessed image for optimal wall detection")
+            logger.info("  Preprocessed image for optimal wall detection")
             
-            return image_path
+            return processed
             
         except Exception as e:
-            print(f"Warning: Image preprocessing failed: {e}")
-            return image_path  # Return original if preprocessing fails
+            logger.warning("Image preprocessing failed: %s", e)
+            return img  # Return original if preprocessing fails
     
     def _validate_image_quality(self, img) -> Tuple[bool, str]:
         """Validate image quality for architectural analysis"""
@@ -233,12 +253,10 @@ class PDFConverter:
     def get_page_count(self, pdf_path: str) -> int:
         """Get number of pages in PDF"""
         try:
-            doc = fitz.open(pdf_path)
-            count = len(doc)
-            doc.close()
-            return count
+            with fitz.open(pdf_path) as doc:
+                return len(doc)
         except Exception as e:
-            print(f"Error reading PDF: {e}")
+            logger.error("Error reading PDF: %s", e)
             return 0
     
     def validate_pdf(self, pdf_path: str) -> Tuple[bool, str]:
@@ -249,9 +267,8 @@ class PDFConverter:
             Tuple of (is_valid, error_message)
         """
         try:
-            doc = fitz.open(pdf_path)
-            page_count = len(doc)
-            doc.close()
+            with fitz.open(pdf_path) as doc:
+                page_count = len(doc)
             
             if page_count == 0:
                 return False, "PDF file contains no pages"
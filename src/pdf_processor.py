@@ -3,8 +3,8 @@ PDFProcessor - Extract vector paths and generate AI-ready images from PDF drawin
 """
 import fitz  # PyMuPDF
 from PIL import Image
-import io
 import logging
+from typing import Union
 
 logger = logging.getLogger(__name__)
 
@@ -12,13 +12,21 @@ logger = logging.getLogger(__name__)
 class PDFProcessor:
     """Handles PDF processing for architectural drawings"""
     
-    def __init__(self, pdf_path: str):
+    def __init__(self, pdf_path: Union[str, bytes]):
+        """
+        Args:
+            pdf_path: Path to the PDF, or its raw bytes (opened in memory, no file needed)
+        """
         self.pdf_path = pdf_path
         self.doc = None
         self.vector_paths = []
+        self.vector_paths_page = None  # page the cached vector_paths belong to
         
     def __enter__(self):
-        self.doc = fitz.open(self.pdf_path)
+        if isinstance(self.pdf_path, (bytes, bytearray, memoryview)):
+            self.doc = fitz.open(stream=self.pdf_path, filetype="pdf")
+        else:
+            self.doc = fitz.open(self.pdf_path)
         return self
         
     def __exit__(self, exc_type, exc_val, exc_tb):
@@ -44,6 +52,7 @@ class PDFProcessor:
         
         page = self.doc[page_num]
         self.vector_paths = page.get_drawings()
+        self.vector_paths_page = page_num
         
         logger.info(f"Extracted {len(self.vector_paths)} vector paths from page {page_num}")
         return self.vector_paths
@@ -74,11 +83,10 @@ class PDFProcessor:
         
         # Convert to image at specified DPI
         mat = fitz.Matrix(dpi / 72, dpi / 72)  # 72 DPI is default
-        pix = page.get_pixmap(matrix=mat)
+        pix = page.get_pixmap(matrix=mat, alpha=False)
         
-        # Convert to PIL Image
-        img_data = pix.pil_tobytes(format="PNG")
-        img = Image.open(io.BytesIO(img_data))
+        # Wrap the raw RGB samples directly (no PNG encode/decode round-trip)
+        img = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
         
         metadata = {
             "width_px": pix.width,
@@ -95,6 +103,8 @@ class PDFProcessor:
     def get_page_info(self, page_num: int = 0) -> dict:
         """
         Get information about a PDF page.
+        Call extract_vector_paths first to have the path count taken from its
+        result instead of extracting the page's drawings a second time.
         
         Args:
             page_num: Page number (0-indexed)
@@ -110,6 +120,10 @@ class PDFProcessor:
         
         page = self.doc[page_num]
         page_rect = page.rect
+        if self.vector_paths_page == page_num:
+            num_vector_paths = len(self.vector_paths)
+        else:
+            num_vector_paths = len(page.get_drawings())
         
         return {
             "page_num": page_num,
@@ -118,5 +132,5 @@ class PDFProcessor:
             "height_pt": page_rect.height,
             "has_text": len(page.get_text().strip()) > 0,
             "num_images": len(page.get_images()),
-            "num_vector_paths": len(page.get_drawings())
+            "num_vector_paths": num_vector_paths
         }
@@ -1,7 +1,25 @@
 import fitz  # PyMuPDF
 import ezdxf
+import numpy as np
+from functools import lru_cache
+from math import comb
 from typing import List, Dict, Tuple, Optional
 import os
+import traceback
+
+
+@lru_cache(maxsize=8)
+def _bezier_weights(num_segments: int, degree: int) -> np.ndarray:
+    """
+    Bernstein basis weights for sampling a Bezier curve at num_segments + 1 evenly
+    spaced t values. Row i times the (degree + 1, 2) control points is the curve
+    point at t = i / num_segments. Computed once per (num_segments, degree).
+    """
+    t = np.arange(num_segments + 1, dtype=np.float64)[:, None] / num_segments
+    k = np.arange(degree + 1)
+    weights = np.array([comb(degree, j) for j in k], dtype=np.float64) * (1 - t) ** (degree - k) * t ** k
+    weights.setflags(write=False)  # shared between calls
+    return weights
 
 class PDFVectorExtractor:
     """
@@ -202,7 +220,6 @@ class PDFVectorExtractor:
             
         except Exception as e:
             print(f"Error extracting vector paths: {e}")
-            import traceback
             traceback.print_exc()
             return {'success': False, 'vector_count': 0, 'error': str(e)}
     
@@ -255,19 +272,9 @@ class PDFVectorExtractor:
         if len(control_points) != 4:
             return control_points
         
-        p0, p1, p2, p3 = control_points
-        points = []
-        
-        for i in range(num_segments + 1):
-            t = i / num_segments
-            
-            # Cubic Bezier formula
-            x = (1-t)**3 * p0[0] + 3*(1-t)**2*t * p1[0] + 3*(1-t)*t**2 * p2[0] + t**3 * p3[0]
-            y = (1-t)**3 * p0[1] + 3*(1-t)**2*t * p1[1] + 3*(1-t)*t**2 * p2[1] + t**3 * p3[1]
-            
-            points.append((x, y))
-        
-        return points
+        # Cubic Bezier formula, evaluated for all t at once
+        points = _bezier_weights(num_segments, 3) @ np.asarray(control_points, dtype=np.float64)
+        return [tuple(p) for p in points.tolist()]
     
     def _approximate_quadratic(self, control_points: List[Tuple[float, float]], 
                                num_segments: int = 8) -> List[Tuple[float, float]]:
@@ -281,19 +288,9 @@ class PDFVectorExtractor:
         if len(control_points) != 3:
             return control_points
         
-        p0, p1, p2 = control_points
-        points = []
-        
-        for i in range(num_segments + 1):
-            t = i / num_segments
-            
-            # Quadratic Bezier formula
-            x = (1-t)**2 * p0[0] + 2*(1-t)*t * p1[0] + t**2 * p2[0]
-            y = (1-t)**2 * p0[1] + 2*(1-t)*t * p1[1] + t**2 * p2[1]
-            
-            points.append((x, y))
-        
-        return points
+        # Quadratic Bezier formula, evaluated for all t at once
+        points = _bezier_weights(num_segments, 2) @ np.asarray(control_points, dtype=np.float64)
+        return [tuple(p) for p in points.tolist()]
     
     def check_pdf_has_vector_content(self, pdf_path: str, page_num: int = 0) -> Tuple[bool, str]:
         """
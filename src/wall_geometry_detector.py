@@ -82,69 +82,60 @@ class WallGeometryDetector:
             if len(group_lines) < 2:
                 continue
             
-            # Check each pair in the group
-            for i in range(len(group_lines)):
-                for j in range(i + 1, len(group_lines)):
-                    line1 = group_lines[i]
-                    line2 = group_lines[j]
-                    
-                    # Calculate perpendicular distance between parallel lines
-                    distance = self._perpendicular_distance(line1, line2)
-                    
-                    # Check if distance is within wall thickness range
-                    if self.wall_thickness_min <= distance <= self.wall_thickness_max:
-                        # Check if lines overlap (are adjacent)
-                        if self._lines_overlap(line1, line2):
-                            parallel_pairs.append((line1, line2, distance))
+            # Check every pair in the group at once
+            for i, j, distance in self._find_group_pairs(group_lines):
+                parallel_pairs.append((group_lines[i], group_lines[j], distance))
         
         print(f"Found {len(parallel_pairs)} parallel line pairs (potential walls)")
         return parallel_pairs
     
-    def _perpendicular_distance(self, line1: Dict, line2: Dict) -> float:
-        """Calculate perpendicular distance between two parallel lines"""
-        # Use midpoints to calculate distance
-        p1 = line1['midpoint']
-        p2 = line2['midpoint']
-        
-        # Calculate distance
-        dist = math.sqrt((p2[0] - p1[0])**2 + (p2[1] - p1[1])**2)
-        
-        # Adjust for angle - we want perpendicular distance
-        angle_diff = abs(line1['angle'] - line2['angle'])
-        if angle_diff > 90:
-            angle_diff = 180 - angle_diff
-        
-        # If lines are truly parallel, use projection
-        angle_rad = math.radians(line1['angle'])
-        perpendicular_angle = angle_rad + math.pi / 2
-        
-        # Project distance onto perpendicular direction
-        dx = p2[0] - p1[0]
-        dy = p2[1] - p1[1]
-        perp_dist = abs(dx * math.sin(angle_rad) - dy * math.cos(angle_rad))
-        
-        return perp_dist
-    
-    def _lines_overlap(self, line1: Dict, line2: Dict) -> bool:
-        """Check if two lines overlap along their direction (are adjacent)"""
-        # Project line endpoints onto a common axis
-        angle_rad = math.radians(line1['angle'])
-        
-        # Project line1 endpoints
-        l1_s = line1['start'][0] * math.cos(angle_rad) + line1['start'][1] * math.sin(angle_rad)
-        l1_e = line1['end'][0] * math.cos(angle_rad) + line1['end'][1] * math.sin(angle_rad)
-        l1_min, l1_max = min(l1_s, l1_e), max(l1_s, l1_e)
-        
-        # Project line2 endpoints
-        l2_s = line2['start'][0] * math.cos(angle_rad) + line2['start'][1] * math.sin(angle_rad)
-        l2_e = line2['end'][0] * math.cos(angle_rad) + line2['end'][1] * math.sin(angle_rad)
-        l2_min, l2_max = min(l2_s, l2_e), max(l2_s, l2_e)
-        
-        # Check for overlap with some tolerance
+    def _find_group_pairs(self, group_lines: List[Dict], max_block_cells: int = 1 << 20):
+        """
+        Check all pairs (i < j) of one angle group at once, yielded in the same
+        order as a nested loop. The distance is the perpendicular offset of line j's
+        midpoint from line i's direction; lines overlap when their projections onto
+        that direction meet within a 5-unit gap. Rows are processed in blocks to
+        bound memory on large groups.
+        
+        Yields:
+            (i, j, distance) for pairs within wall thickness range that overlap
+        """
+        n = len(group_lines)
+        start = np.array([line['start'] for line in group_lines], dtype=np.float64)
+        end = np.array([line['end'] for line in group_lines], dtype=np.float64)
+        mid = np.array([line['midpoint'] for line in group_lines], dtype=np.float64)
+        angle_rad = np.radians([line['angle'] for line in group_lines])
+        cos_a, sin_a = np.cos(angle_rad), np.sin(angle_rad)
         tolerance = 5.0  # Allow small gaps
-        overlap = max(0, min(l1_max, l2_max) - max(l1_min, l2_min) + tolerance)
         
-        return overlap > 0
+        block = max(1, max_block_cells // n)
+        cols = np.arange(n)
+        for row_start in range(0, n - 1, block):
+            rows = np.arange(row_start, min(row_start + block, n - 1))
+            cos_r = cos_a[rows, None]
+            sin_r = sin_a[rows, None]
+            
+            # Perpendicular distance of line j's midpoint from line i's direction
+            dx = mid[None, :, 0] - mid[rows, None, 0]
+            dy = mid[None, :, 1] - mid[rows, None, 1]
+            distance = np.abs(dx * sin_r - dy * cos_r)
+            
+            # Overlap of both lines projected onto line i's direction
+            l1_s = start[rows, 0] * cos_a[rows] + start[rows, 1] * sin_a[rows]
+            l1_e = end[rows, 0] * cos_a[rows] + end[rows, 1] * sin_a[rows]
+            l2_s = start[None, :, 0] * cos_r + start[None, :, 1] * sin_r
+            l2_e = end[None, :, 0] * cos_r + end[None, :, 1] * sin_r
+            overlap = (np.minimum(np.maximum(l1_s, l1_e)[:, None], np.maximum(l2_s, l2_e))
+                       - np.maximum(np.minimum(l1_s, l1_e)[:, None], np.minimum(l2_s, l2_e))
+                       + tolerance)
+            
+            mask = ((cols[None, :] > rows[:, None])
+                    & (distance >= self.wall_thickness_min)
+                    & (distance <= self.wall_thickness_max)
+                    & (overlap > 0))
+            
+            for r, j in zip(*np.nonzero(mask)):
+                yield int(rows[r]), int(j), float(distance[r, j])
     
     def trace_wall_boundaries(self, parallel_pairs: List[Tuple[Dict, Dict, float]]) -> Dict:
         """
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+from scipy.spatial import KDTree
+
+from src.advanced_wall_detector import AdvancedWallDetector
+
+
+def reference_snap(vertices, tolerance):
+    """The original per-vertex greedy clustering that _snap_vertices must reproduce"""
+    vertices_array = np.array(vertices)
+    tree = KDTree(vertices_array)
+    visited = set()
+    unique_vertices = []
+    for i, vertex in enumerate(vertices):
+        if i in visited:
+            continue
+        indices = tree.query_ball_point(vertex, tolerance)
+        unique_vertices.append(tuple(vertices_array[indices].mean(axis=0)))
+        visited.update(indices)
+    return unique_vertices
+
+
+def drawing_like_vertices(seed, n_points=400):
+    """Grid-ish wall corners with shared endpoints (exact duplicates) and near-misses"""
+    rng = np.random.default_rng(seed)
+    base = rng.integers(0, 60, size=(n_points, 2)).astype(float) * 2.0
+    jitter = rng.random((n_points, 2)) * 0.3
+    jitter[rng.random(n_points) < 0.5] = 0.0
+    points = base + jitter
+    duplicates = points[rng.integers(0, n_points, size=n_points // 2)]
+    mixed = np.vstack([points, duplicates])
+    return [tuple(p) for p in mixed[rng.permutation(len(mixed))].tolist()]
+
+
+@pytest.fixture
+def detector():
+    AdvancedWallDetector._snap_cache.clear()
+    return AdvancedWallDetector()
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_snap_matches_reference(detector, seed):
+    vertices = drawing_like_vertices(seed)
+    expected = reference_snap(vertices, detector.snap_tolerance)
+    result = detector._snap_vertices(vertices)
+    assert len(result) == len(expected)
+    np.testing.assert_allclose(result, expected, rtol=0, atol=1e-9)
+
+
+def test_snap_isolated_points_keep_order(detector):
+    vertices = [(10.0, 0.0), (0.0, 0.0), (5.0, 5.0)]
+    assert detector._snap_vertices(vertices) == vertices
+
+
+def test_snap_accepts_array_and_empty(detector):
+    vertices = drawing_like_vertices(7, n_points=50)
+    assert detector._snap_vertices(np.array(vertices)) == detector._snap_vertices(vertices)
+    assert detector._snap_vertices([]) == []
+
+
+def test_snap_cache_returns_copies(detector):
+    vertices = drawing_like_vertices(3, n_points=50)
+    first = detector._snap_vertices(vertices)
+    first.append((-1.0, -1.0))
+    second = detector._snap_vertices(vertices)
+    assert (-1.0, -1.0) not in second
+    assert len(AdvancedWallDetector._snap_cache) == 1
+
+
+def test_snap_cache_keyed_by_tolerance(detector):
+    vertices = [(0.0, 0.0), (0.4, 0.0)]
+    assert len(detector._snap_vertices(vertices)) == 1
+    detector.snap_tolerance = 0.1
+    assert len(detector._snap_vertices(vertices)) == 2
@@ -0,0 +1,148 @@
+import json
+import os
+
+from PIL import Image, ImageDraw
+
+from src.analysis_cache import AnalysisCache, hamming_distance, hash_file, perceptual_hash
+
+
+def test_set_get_roundtrip(tmp_path):
+    cache = AnalysisCache(str(tmp_path))
+    key = AnalysisCache.make_key('abc', 0, 'floor')
+    assert key == 'abc:0:floor'
+    assert cache.get(key) is None
+    assert cache.set(key, {'spaces': [[1, 2]]})
+    assert cache.get(key) == {'spaces': [[1, 2]]}
+
+
+def test_set_is_atomic_and_leaves_no_temp_files(tmp_path):
+    cache = AnalysisCache(str(tmp_path))
+    assert cache.set('k', {'v': 1})
+    # A value that cannot be serialized fails without clobbering the stored entry
+    assert not cache.set('k', {'v': object()})
+    assert cache.get('k') == {'v': 1}
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+
+
+def test_unreadable_entry_is_a_miss(tmp_path):
+    cache = AnalysisCache(str(tmp_path))
+    cache.set('k', {'v': 1})
+    with open(cache._entry_path('k'), 'w') as f:
+        f.write('{not json')
+    assert cache.get('k') is None
+
+
+def test_hash_file_matches_content(tmp_path):
+    a, b = tmp_path / 'a.bin', tmp_path / 'b.bin'
+    a.write_bytes(b'x' * 3_000_000)
+    b.write_bytes(b'x' * 3_000_000)
+    assert hash_file(str(a)) == hash_file(str(b))
+    b.write_bytes(b'y')
+    assert hash_file(str(a)) != hash_file(str(b))
+
+
+def test_get_or_compute(tmp_path):
+    cache = AnalysisCache(str(tmp_path))
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {'n': len(calls)}
+
+    assert cache.get_or_compute('k', compute) == {'n': 1}
+    assert cache.get_or_compute('k', compute) == {'n': 1}
+    assert cache.get_or_compute('k', compute, use_cache=False) == {'n': 2}
+    assert len(calls) == 2
+
+
+def test_hamming_distance():
+    assert hamming_distance(0, 0) == 0
+    assert hamming_distance(0b1011, 0b0001) == 2
+    assert hamming_distance(0, (1 << 64) - 1) == 64
+
+
+def test_perceptual_hash_near_duplicates():
+    image = Image.new('L', (400, 300), 255)
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((50, 50, 350, 250), outline=0, width=6)
+    draw.line((50, 150, 350, 150), fill=0, width=4)
+    rescaled = image.resize((800, 600))
+    other = Image.linear_gradient('L').resize((400, 300))
+    assert hamming_distance(perceptual_hash(image), perceptual_hash(rescaled)) <= 5
+    assert hamming_distance(perceptual_hash(image), perceptual_hash(other)) > 5
+
+
+def test_find_similar_respects_threshold_and_namespace(tmp_path):
+    cache = AnalysisCache(str(tmp_path), phash_threshold=2)
+    cache.set('stored', {'v': 1})
+    cache.remember_phash(0b1111, 'stored', namespace='floor:100x100')
+
+    assert cache.find_similar(0b1111, 'floor:100x100') == 'stored'
+    assert cache.find_similar(0b1100, 'floor:100x100') == 'stored'   # distance 2
+    assert cache.find_similar(0b1000, 'floor:100x100') is None       # distance 3
+    assert cache.find_similar(0b1111, 'floor:200x200') is None
+
+
+def test_find_similar_picks_closest(tmp_path):
+    cache = AnalysisCache(str(tmp_path), phash_threshold=5)
+    cache.remember_phash(0b0000, 'far')
+    cache.remember_phash(0b0111, 'near')
+    assert cache.find_similar(0b1111) == 'near'
+
+
+def test_phash_index_reloads_after_external_write(tmp_path):
+    writer = AnalysisCache(str(tmp_path))
+    reader = AnalysisCache(str(tmp_path))
+    assert reader.find_similar(42) is None
+    writer.remember_phash(42, 'other-process')
+    # Force a distinct mtime in case both writes land in the same timestamp tick
+    index_path = tmp_path / 'phash_index.json'
+    stat = os.stat(index_path)
+    os.utime(index_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert reader.find_similar(42) == 'other-process'
+
+
+def test_get_or_compute_reuses_near_duplicate(tmp_path):
+    cache = AnalysisCache(str(tmp_path), phash_threshold=3)
+    first = cache.get_or_compute('a', lambda: {'from': 'a'}, phash=lambda: 0b1010, namespace='ns')
+    assert first == {'from': 'a'}
+
+    def must_not_run():
+        raise AssertionError("near-duplicate should have been reused")
+
+    assert cache.get_or_compute('b', must_not_run, phash=lambda: 0b1011, namespace='ns') == {'from': 'a'}
+    # The borrowed result is not pinned to the new key, so a false match can't stick
+    assert cache.get('b') is None
+    # Another namespace does not share results
+    assert cache.get_or_compute('c', lambda: {'from': 'c'}, phash=lambda: 0b1010,
+                                namespace='other') == {'from': 'c'}
+    with open(os.path.join(str(tmp_path), 'phash_index.json')) as f:
+        assert set(json.load(f)) == {'ns', 'other'}
+
+
+def test_phash_index_merges_entries_from_other_processes(tmp_path):
+    first = AnalysisCache(str(tmp_path))
+    second = AnalysisCache(str(tmp_path))
+    assert second.find_similar(1) is None  # second now holds an (empty) in-memory index
+    first.remember_phash(1, 'from-first')
+    # Hide the rewrite from the mtime check, as a write within one timestamp tick would
+    index_path = tmp_path / 'phash_index.json'
+    os.utime(index_path, ns=(0, 0))
+    second._phash_index_mtime = 0
+    second.remember_phash(2, 'from-second')
+
+    with open(index_path) as f:
+        assert json.load(f) == {'': {f'{1:016x}': 'from-first', f'{2:016x}': 'from-second'}}
+
+
+def test_phash_index_is_capped(tmp_path):
+    cache = AnalysisCache(str(tmp_path), phash_threshold=0, max_phash_entries=3)
+    for phash in range(3):
+        cache.remember_phash(phash, f'a{phash}', namespace='a')
+    cache.remember_phash(0, 'a0', namespace='a')  # refreshed: now the newest in 'a'
+    cache.remember_phash(10, 'b10', namespace='b')
+
+    assert cache.find_similar(1, 'a') is None      # oldest entry of the largest namespace
+    assert cache.find_similar(0, 'a') == 'a0'
+    assert cache.find_similar(2, 'a') == 'a2'
+    assert cache.find_similar(10, 'b') == 'b10'
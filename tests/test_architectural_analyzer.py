@@ -0,0 +1,84 @@
+import pytest
+
+from src.analysis_cache import AnalysisCache
+from src.architectural_analyzer import ArchitecturalAnalyzer
+
+
+@pytest.fixture
+def analyzer(tmp_path):
+    return ArchitecturalAnalyzer(cache=AnalysisCache(str(tmp_path)))
+
+
+def test_commands_keep_element_order(analyzer):
+    analysis = {
+        'drawing_type': 'floor_plan',
+        'spaces': [
+            {'layer_name': 'A', 'coordinates': [[0, 0], [1, 1]]},
+            {'layer_name': 'A', 'coordinates': [[2, 2], [3, 3]]},
+            {'layer_name': 'B', 'coordinates': [[0, 0]]},
+            {'layer_name': 'A', 'coordinates': [[5, 5], [6.5, 6]]},
+        ],
+    }
+    assert analyzer.generate_autocad_commands(analysis) == [
+        '-LAYER M A',
+        'PLINE 0,0 1,1 C',
+        'PLINE 2,2 3,3 C',
+        '-LAYER M B',
+        '-LAYER M A',
+        'PLINE 5,5 6.5,6 C',
+    ]
+
+
+def test_elevation_commands(analyzer):
+    analysis = {
+        'drawing_type': 'elevation',
+        'elements': [
+            {'layer_name': 'front_door_main', 'coordinates': [[0, 0], [3, 0], [3, 7], [0, 7]]},
+            {'layer_name': 'front_window_main', 'coordinates': [[5, 2], [8, 2]]},
+        ],
+    }
+    assert analyzer.generate_autocad_commands(analysis) == [
+        '-LAYER M front_door_main',
+        'RECTANG 0,0 3,7',
+        '-LAYER M front_window_main',
+    ]
+
+
+def test_cache_namespace_uses_each_images_own_size(analyzer, monkeypatch):
+    from PIL import Image
+
+    seen = []
+    monkeypatch.setattr(analyzer.cache, 'get_or_compute',
+                        lambda key, compute, **kwargs: seen.append(kwargs['namespace']) or {})
+    analyzer._cached_analysis(Image.new('RGB', (30, 20)), 'floor', dict)
+    analyzer._cached_analysis(Image.new('RGB', (40, 10)), 'floor', dict)
+    assert seen == [f'floor:{analyzer.PROMPT_VERSION}:30x20', f'floor:{analyzer.PROMPT_VERSION}:40x10']
+    assert not hasattr(analyzer, 'last_image_size')
+
+
+def test_floor_plan_coordinates_are_scaled_back_to_the_original_image(analyzer, monkeypatch):
+    import json
+    from types import SimpleNamespace
+    from PIL import Image
+
+    import src.architectural_analyzer as module
+
+    requests = []
+
+    def create(**kwargs):
+        requests.append(kwargs)
+        content = json.dumps({'spaces': [{'type': 'exterior',
+                                          'coordinates': [[10, 10], [100, 10], [100, 50], [10, 50]]}]})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(module, 'openai', client)
+
+    # Twice the vision size: the request carries a half-size JPEG
+    image = Image.new('RGB', (analyzer.VISION_MAX_SIDE * 2, analyzer.VISION_MAX_SIDE), 'white')
+    result = analyzer._analyze_floor_plan_uncached(image)
+
+    assert len(requests) == 1
+    image_url = requests[0]['messages'][1]['content'][1]['image_url']['url']
+    assert image_url.startswith('data:image/jpeg;base64,')
+    assert result['spaces'][0]['coordinates'][:4] == [[20, 20], [200, 20], [200, 100], [20, 100]]
@@ -0,0 +1,100 @@
+import ezdxf
+import pytest
+
+from src.autocad_integration import AutoCADIntegration
+
+
+class StubProcessor:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = 0
+
+    def process_dxf_geometry(self, integration, analyzer=None):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("enhanced processing unavailable")
+        return {'drawing_type': 'floor_plan', 'elements': [], 'calls': self.calls}
+
+
+class StubAnalyzer:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = 0
+
+    def analyze_geometric_data(self, geometric_data, spatial_analysis):
+        self.calls += 1
+        if self.fail:
+            raise TimeoutError("Request timed out")
+        return {}
+
+
+@pytest.fixture
+def dxf_path(tmp_path):
+    doc = ezdxf.new()
+    msp = doc.modelspace()
+    msp.add_lwpolyline([(0, 0), (100, 0), (100, 60), (0, 60)], close=True)
+    msp.add_line((50, 0), (50, 60))
+    path = tmp_path / "plan.dxf"
+    doc.saveas(path)
+    return str(path)
+
+
+@pytest.fixture(autouse=True)
+def empty_geometry_cache():
+    AutoCADIntegration._geometry_cache.clear()
+    yield
+    AutoCADIntegration._geometry_cache.clear()
+
+
+def load(path, processor):
+    integration = AutoCADIntegration()
+    assert integration.load_dxf_file(path)
+    integration.enhanced_processor = processor
+    return integration
+
+
+def test_enhanced_result_is_cached_by_content(dxf_path):
+    processor = StubProcessor()
+    first = load(dxf_path, processor).analyze_dxf_geometry()
+    first['elements'].append('mutated')
+
+    second = load(dxf_path, processor).analyze_dxf_geometry()
+
+    assert processor.calls == 1
+    assert second == {'drawing_type': 'floor_plan', 'elements': [], 'calls': 1}
+
+
+def test_fallback_result_is_not_cached(dxf_path):
+    failing = StubProcessor(fail=True)
+    fallback = load(dxf_path, failing).analyze_dxf_geometry()
+
+    assert fallback['drawing_type'] == 'floor_plan'
+    assert 'calls' not in fallback
+    assert AutoCADIntegration._geometry_cache == {}
+
+    # Once the enhanced processor recovers, the same file is analyzed again
+    recovered = StubProcessor()
+    result = load(dxf_path, recovered).analyze_dxf_geometry()
+
+    assert recovered.calls == 1
+    assert result['calls'] == 1
+    assert len(AutoCADIntegration._geometry_cache) == 1
+
+
+def test_result_with_failed_ai_step_is_not_cached(dxf_path):
+    integration = AutoCADIntegration()
+    assert integration.load_dxf_file(dxf_path)
+    result = integration.analyze_dxf_geometry(analyzer=StubAnalyzer(fail=True))
+
+    assert result['analysis_metadata']['ai_enhanced'] is False
+    assert AutoCADIntegration._geometry_cache == {}
+
+    # The next upload of the same DXF retries the AI step and caches its result
+    analyzer = StubAnalyzer()
+    integration = AutoCADIntegration()
+    assert integration.load_dxf_file(dxf_path)
+    result = integration.analyze_dxf_geometry(analyzer=analyzer)
+
+    assert analyzer.calls == 1
+    assert result['analysis_metadata']['ai_enhanced'] is True
+    assert len(AutoCADIntegration._geometry_cache) == 1
@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+import app as app_module
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    outputs = tmp_path / 'outputs'
+    outputs.mkdir()
+    (outputs / 'drawing.dxf').write_text('0\nEOF\n')
+    (tmp_path / 'secret.txt').write_text('secret')
+    monkeypatch.setitem(app_module.app.config, 'OUTPUT_FOLDER', str(outputs))
+    monkeypatch.setitem(app_module.app.config, 'X_ACCEL_REDIRECT', None)
+    return app_module.app.test_client()
+
+
+def test_download_existing_file(client):
+    response = client.get('/download/drawing.dxf')
+    assert response.status_code == 200
+    assert response.data == b'0\nEOF\n'
+    assert 'attachment' in response.headers['Content-Disposition']
+
+
+def test_download_conditional_request(client):
+    etag = client.get('/download/drawing.dxf').headers['ETag']
+    response = client.get('/download/drawing.dxf', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
+
+def test_download_missing_file(client):
+    assert client.get('/download/nope.dxf').status_code == 404
+
+
+def test_download_accel_redirect(client, monkeypatch):
+    monkeypatch.setitem(app_module.app.config, 'X_ACCEL_REDIRECT', '/protected/')
+    response = client.get('/download/drawing.dxf')
+    assert response.status_code == 200
+    assert response.headers['X-Accel-Redirect'] == '/protected/drawing.dxf'
+    assert response.data == b''
+
+
+@pytest.mark.parametrize('name', ['..%2Fsecret.txt', '%2E%2E%2Fsecret.txt', '..%5Csecret.txt'])
+def test_download_rejects_traversal(client, name):
+    response = client.get(f'/download/{name}')
+    assert response.status_code == 404
+    assert b'secret' not in response.data
+
+
+def test_download_rejects_symlink_out_of_outputs(client, tmp_path):
+    os.symlink(tmp_path / 'secret.txt', tmp_path / 'outputs' / 'link.dxf')
+    response = client.get('/download/link.dxf')
+    assert response.status_code == 404
+    assert b'secret' not in response.data
+
+
+def test_download_rejects_directory(client, tmp_path):
+    (tmp_path / 'outputs' / 'subdir').mkdir()
+    assert client.get('/download/subdir').status_code == 404
+
+
+@pytest.mark.parametrize('name', ['../secret.txt', '/etc/passwd', 'sub/../../secret.txt'])
+def test_download_view_rejects_paths_outside_outputs(client, name):
+    # The router never passes a "/" to the view; call it directly to exercise the guard
+    with app_module.app.test_request_context():
+        response, status = app_module.download_file(name)
+    assert status == 404
@@ -0,0 +1,97 @@
+import math
+import time
+
+import pytest
+
+from src.job_queue import JobQueue, QueueFull
+
+
+def wait_done(queue, job_id, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while queue.status(job_id) not in ('finished', 'failed'):
+        assert time.monotonic() < deadline, f"job {job_id} did not finish"
+        time.sleep(0.02)
+
+
+@pytest.fixture
+def queue_factory():
+    queues = []
+
+    def make(**kwargs):
+        queue = JobQueue(max_workers=1, **kwargs)
+        queues.append(queue)
+        return queue
+
+    yield make
+    for queue in queues:
+        queue.shutdown()
+
+
+def test_workers_use_spawn(queue_factory):
+    queue = queue_factory()
+    assert queue.executor._mp_context.get_start_method() == 'spawn'
+
+
+def test_result_and_failure(queue_factory):
+    queue = queue_factory()
+    ok = queue.submit(math.sqrt, 16.0)
+    bad = queue.submit(math.sqrt, -1.0)
+    wait_done(queue, ok)
+    wait_done(queue, bad)
+
+    assert queue.status(ok) == 'finished'
+    assert queue.result(ok) == 4.0
+    assert queue.status(bad) == 'failed'
+    with pytest.raises(ValueError):
+        queue.result(bad)
+
+
+def test_unknown_job(queue_factory):
+    queue = queue_factory()
+    assert queue.status('missing') is None
+    with pytest.raises(KeyError):
+        queue.result('missing')
+
+
+def test_queue_full_until_slot_released(queue_factory):
+    queue = queue_factory(max_pending=1)
+    job_id = queue.submit(time.sleep, 0.5)
+    with pytest.raises(QueueFull):
+        queue.submit(math.sqrt, 4.0)
+
+    wait_done(queue, job_id)
+    # The slot is released by a done callback, which may run just after status flips
+    deadline = time.monotonic() + 5.0
+    while True:
+        try:
+            second = queue.submit(math.sqrt, 4.0)
+            break
+        except QueueFull:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+    wait_done(queue, second)
+    assert queue.result(second) == 2.0
+
+
+def test_prune_drops_oldest_finished_jobs(queue_factory):
+    queue = queue_factory(max_history=2)
+    first = queue.submit(math.sqrt, 1.0)
+    wait_done(queue, first)
+    second = queue.submit(math.sqrt, 4.0)
+    wait_done(queue, second)
+    third = queue.submit(time.sleep, 0.2)
+
+    assert queue.status(first) is None
+    assert queue.status(second) == 'finished'
+    assert queue.status(third) in ('queued', 'running', 'finished')
+    wait_done(queue, third)
+
+
+def test_prune_keeps_unfinished_jobs(queue_factory):
+    queue = queue_factory(max_history=1)
+    jobs = [queue.submit(time.sleep, 0.3) for _ in range(3)]
+    # Over max_history, but none were finished when pruned, so all are still tracked
+    assert all(queue.status(job_id) is not None for job_id in jobs[1:])
+    for job_id in jobs:
+        if queue.status(job_id) is not None:
+            wait_done(queue, job_id)
@@ -0,0 +1,25 @@
+import json
+
+import numpy as np
+import pytest
+
+import app as app_module
+
+
+PAYLOAD = {'coords': np.array([[1.5, 2.0], [3.0, 4.0]]), 'confidence': np.float32(0.75),
+           'count': np.int64(3), 'layers': ['EXTERIOR_OUTER']}
+EXPECTED = {'coords': [[1.5, 2.0], [3.0, 4.0]], 'confidence': 0.75, 'count': 3,
+            'layers': ['EXTERIOR_OUTER']}
+
+
+@pytest.mark.parametrize('provider_class', [app_module.NumPyJSONProvider, app_module.ORJSONProvider])
+def test_providers_serialize_numpy(provider_class):
+    if provider_class is app_module.ORJSONProvider and app_module.orjson is None:
+        pytest.skip("orjson not installed")
+    provider = provider_class(app_module.app)
+    assert json.loads(provider.dumps(PAYLOAD)) == EXPECTED
+
+
+def test_provider_matches_orjson_availability():
+    expected = app_module.ORJSONProvider if app_module.orjson is not None else app_module.NumPyJSONProvider
+    assert type(app_module.app.json) is expected
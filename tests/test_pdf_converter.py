@@ -0,0 +1,69 @@
+import os
+
+import fitz
+import pytest
+
+from src.pdf_converter import PDFConverter
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    path = tmp_path / "plan.pdf"
+    doc = fitz.open()
+    for _ in range(3):
+        page = doc.new_page(width=200, height=150)
+        page.draw_rect(fitz.Rect(20, 20, 180, 130), color=(0, 0, 0), width=2)
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+def test_convert_selected_pages(pdf_path, tmp_path):
+    out = tmp_path / "out"
+    paths = PDFConverter(dpi=72).convert_to_images(pdf_path, str(out), pages=[3, 1])
+
+    assert [os.path.basename(p) for p in paths] == ["plan_page_3.png", "plan_page_1.png"]
+    assert all(os.path.exists(p) for p in paths)
+
+
+def test_out_of_range_page_is_rejected(pdf_path, tmp_path):
+    with pytest.raises(Exception, match="out of range"):
+        PDFConverter(dpi=72).convert_to_images(pdf_path, str(tmp_path), pages=[4])
+
+
+def test_render_failure_closes_document_and_removes_rendered_pages(pdf_path, tmp_path, monkeypatch):
+    out = tmp_path / "out"
+    converter = PDFConverter(dpi=72)
+    opened = []
+    real_open = fitz.open
+    render_page = converter._render_page
+
+    def tracking_open(*args, **kwargs):
+        doc = real_open(*args, **kwargs)
+        opened.append(doc)
+        return doc
+
+    def failing_render(doc, page_num, *args):
+        if page_num == 1:
+            raise IOError("disk full")
+        return render_page(doc, page_num, *args)
+
+    monkeypatch.setattr(fitz, "open", tracking_open)
+    monkeypatch.setattr(converter, "_render_page", failing_render)
+
+    with pytest.raises(Exception, match="disk full"):
+        converter.convert_to_images(pdf_path, str(out))
+
+    assert len(opened) == 1 and opened[0].is_closed
+    assert os.listdir(out) == []
+
+
+def test_page_count_and_validation(pdf_path, tmp_path):
+    converter = PDFConverter()
+    assert converter.get_page_count(pdf_path) == 3
+    assert converter.validate_pdf(pdf_path) == (True, "")
+
+    bad = tmp_path / "bad.pdf"
+    bad.write_bytes(b"not a pdf")
+    assert converter.get_page_count(str(bad)) == 0
+    assert converter.validate_pdf(str(bad))[0] is False
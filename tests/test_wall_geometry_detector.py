@@ -0,0 +1,96 @@
+import math
+
+import numpy as np
+import pytest
+
+from src.wall_geometry_detector import WallGeometryDetector
+
+
+def perpendicular_distance(line1, line2):
+    """The original per-pair distance that _find_group_pairs must reproduce"""
+    p1, p2 = line1['midpoint'], line2['midpoint']
+    angle_rad = math.radians(line1['angle'])
+    dx = p2[0] - p1[0]
+    dy = p2[1] - p1[1]
+    return abs(dx * math.sin(angle_rad) - dy * math.cos(angle_rad))
+
+
+def lines_overlap(line1, line2):
+    """The original per-pair overlap test that _find_group_pairs must reproduce"""
+    angle_rad = math.radians(line1['angle'])
+    cos_a, sin_a = math.cos(angle_rad), math.sin(angle_rad)
+    l1_s = line1['start'][0] * cos_a + line1['start'][1] * sin_a
+    l1_e = line1['end'][0] * cos_a + line1['end'][1] * sin_a
+    l2_s = line2['start'][0] * cos_a + line2['start'][1] * sin_a
+    l2_e = line2['end'][0] * cos_a + line2['end'][1] * sin_a
+    tolerance = 5.0
+    overlap = max(0, min(max(l1_s, l1_e), max(l2_s, l2_e)) - max(min(l1_s, l1_e), min(l2_s, l2_e)) + tolerance)
+    return overlap > 0
+
+
+def reference_pairs(detector, group_lines):
+    pairs = []
+    for i in range(len(group_lines)):
+        for j in range(i + 1, len(group_lines)):
+            distance = perpendicular_distance(group_lines[i], group_lines[j])
+            if detector.wall_thickness_min <= distance <= detector.wall_thickness_max:
+                if lines_overlap(group_lines[i], group_lines[j]):
+                    pairs.append((i, j, distance))
+    return pairs
+
+
+def make_line(start, end):
+    dx, dy = end[0] - start[0], end[1] - start[1]
+    angle = math.degrees(math.atan2(dy, dx))
+    if angle < 0:
+        angle += 180
+    return {
+        'start': start,
+        'end': end,
+        'length': math.hypot(dx, dy),
+        'angle': angle,
+        'midpoint': ((start[0] + end[0]) / 2, (start[1] + end[1]) / 2),
+    }
+
+
+def random_lines(seed, n_lines=300):
+    """Near-horizontal lines stacked a few units apart, so many pairs fall in wall range"""
+    rng = np.random.default_rng(seed)
+    lines = []
+    for _ in range(n_lines):
+        x, y = rng.uniform(0, 400), rng.uniform(0, 200)
+        length = rng.uniform(5, 120)
+        angle = math.radians(rng.uniform(-2, 2))
+        lines.append(make_line((x, y), (x + length * math.cos(angle), y + length * math.sin(angle))))
+    return lines
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_group_pairs_match_reference(seed):
+    detector = WallGeometryDetector()
+    lines = random_lines(seed)
+    expected = reference_pairs(detector, lines)
+    result = list(detector._find_group_pairs(lines))
+
+    assert expected
+    assert [(i, j) for i, j, _ in result] == [(i, j) for i, j, _ in expected]
+    np.testing.assert_allclose([d for _, _, d in result], [d for _, _, d in expected],
+                               rtol=0, atol=1e-9)
+
+
+def test_group_pairs_blocking_does_not_change_result():
+    detector = WallGeometryDetector()
+    lines = random_lines(5, n_lines=60)
+    assert list(detector._find_group_pairs(lines, max_block_cells=7)) == \
+        list(detector._find_group_pairs(lines))
+
+
+def test_find_parallel_line_pairs():
+    detector = WallGeometryDetector()
+    outer = make_line((0, 0), (100, 0))
+    inner = make_line((0, 6), (100, 6))
+    far = make_line((0, 50), (100, 50))
+    beside = make_line((200, 6), (300, 6))
+    detector.lines = [outer, inner, far, beside]
+
+    assert detector.find_parallel_line_pairs() == [(outer, inner, pytest.approx(6.0))]